@@ -1,10 +1,29 @@
 
+import asyncio
 import json
 import random
-from typing import Optional, Dict, List
-from config import GEMINI_API_KEY
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, List, Tuple, AsyncIterator, Any
+from config import (
+    GEMINI_API_KEY, GEMINI_MAX_CONCURRENCY, GEMINI_TIMEOUT, REPORT_DEADLINE,
+    REPORT_BATCH_SIZE, REPORT_BATCH_TIMEOUT, STRUCTURED_RETRIES,
+)
+from pydantic import ValidationError
+from models import ChallengeResponse
+from cache import hint_cache, hint_key
+from breaker import gemini_breaker
+from metrics import record_llm_call, record_llm_queue_timeout, simulation_label, tag_llm
+from physics import check_challenge
+from expr import compile_expression, challenge_registry
+from bank import challenge_bank, new_challenge_id
+from observations import prompt_summary
 
 _model = None
+_model_lock = threading.Lock()
 def get_model():
     
     global _model
@@ -13,30 +32,202 @@ def get_model():
     if not GEMINI_API_KEY:
         print("⚠️  Gemini API key not set — using offline templates")
         return None
+    # The startup warmup and a first request can race; only one builds it.
+    with _model_lock:
+        if _model is not None:
+            return _model
+        try:
+            import google.generativeai as genai
+            genai.configure(api_key=GEMINI_API_KEY)
+            _model = genai.GenerativeModel("gemini-2.0-flash")
+            print("✅ Gemini model loaded (gemini-2.0-flash)")
+            return _model
+        except Exception as e:
+            print(f"⚠️  Gemini init failed: {e}")
+            return None
+def _generation_config(max_tokens: int, json_mode: bool = False) -> dict:
+    config = {"max_output_tokens": max_tokens, "temperature": 0.7}
+    if json_mode:
+        # Constrains decoding to syntactically valid JSON (no fences, no prose).
+        config["response_mime_type"] = "application/json"
+    return config
+
+_gemini_slots: Optional[asyncio.Semaphore] = None
+def _get_slots() -> asyncio.Semaphore:
+    global _gemini_slots
+    if _gemini_slots is None:
+        _gemini_slots = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+    return _gemini_slots
+
+class _QueueTimeout(Exception):
+    pass
+
+@asynccontextmanager
+async def _gemini_slot(deadline: float):
+    # Waiting for a free slot is local queueing, not Gemini being slow: it
+    # spends the caller's deadline but never counts against the breaker or
+    # the upstream latency histogram.
+    slots = _get_slots()
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=GEMINI_API_KEY)
-        _model = genai.GenerativeModel("gemini-2.0-flash")
-        print("✅ Gemini model loaded (gemini-2.0-flash)")
-        return _model
-    except Exception as e:
-        print(f"⚠️  Gemini init failed: {e}")
-        return None
-def call_gemini(prompt: str, max_tokens: int = 300) -> Optional[str]:
-    
-    model = get_model()
+        await asyncio.wait_for(slots.acquire(), max(deadline - time.monotonic(), 0))
+    except asyncio.TimeoutError:
+        raise _QueueTimeout("no free Gemini slot before the deadline") from None
+    try:
+        if deadline - time.monotonic() <= 0:
+            raise _QueueTimeout("deadline spent waiting for a Gemini slot")
+        yield
+    finally:
+        slots.release()
+
+def _record_timeout(upstream_seconds: float):
+    # A call that got its slot late can run out of deadline before Gemini was
+    # ever slow; only one that outlived the slow-call threshold is evidence.
+    if upstream_seconds > gemini_breaker.slow_call:
+        gemini_breaker.record(False, upstream_seconds)
+    else:
+        gemini_breaker.release()
+
+async def _call_gemini_upstream(prompt: str, max_tokens: int, timeout: float,
+                                json_mode: bool = False) -> Optional[str]:
+    # First use imports and configures the SDK; keep that off the event loop.
+    model = _model or await asyncio.to_thread(get_model)
     if not model:
         return None
+    if not gemini_breaker.allow():
+        record_llm_call("async", 0.0, "short_circuit")
+        return None
+    deadline = time.monotonic() + timeout
+    started = None
     try:
-        response = model.generate_content(
-            prompt,
-            generation_config={"max_output_tokens": max_tokens, "temperature": 0.7}
-        )
+        async with _gemini_slot(deadline):
+            started = time.monotonic()
+            response = await asyncio.wait_for(
+                model.generate_content_async(prompt, generation_config=_generation_config(max_tokens, json_mode)),
+                deadline - started,
+            )
+        gemini_breaker.record(True, time.monotonic() - started)
+        record_llm_call("async", time.monotonic() - started, "ok", response)
         return response.text.strip() if response.text else None
+    except _QueueTimeout as e:
+        gemini_breaker.release()
+        record_llm_queue_timeout()
+        print(f"Gemini call skipped: {e}")
+        return None
+    except asyncio.TimeoutError:
+        _record_timeout(time.monotonic() - started)
+        record_llm_call("async", time.monotonic() - started, "timeout")
+        print(f"Gemini call timed out after {timeout}s")
+        return None
+    except asyncio.CancelledError:
+        gemini_breaker.release()
+        raise
     except Exception as e:
+        gemini_breaker.record(False, time.monotonic() - started)
+        record_llm_call("async", time.monotonic() - started, "error")
         print(f"Gemini call error: {e}")
         return None
 
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+_inflight: Dict[Tuple[str, int, bool], _Flight] = {}
+_singleflight_stats = {"upstream_calls": 0, "coalesced_calls": 0, "abandoned_calls": 0}
+async def call_gemini_async(prompt: str, max_tokens: int = 300,
+                            timeout: float = GEMINI_TIMEOUT, json_mode: bool = False) -> Optional[str]:
+    # Identical concurrent prompts share one upstream call. The shared task is
+    # shielded so a caller that goes away doesn't cancel it for everyone else;
+    # once the last caller has gone it is cancelled, freeing its slot and quota.
+    key = (prompt, max_tokens, json_mode)
+    flight = _inflight.get(key)
+    if flight is None:
+        flight = _Flight(asyncio.ensure_future(_call_gemini_upstream(prompt, max_tokens, timeout, json_mode)))
+        _inflight[key] = flight
+        flight.task.add_done_callback(lambda done: _inflight.pop(key) if _inflight.get(key) is flight else None)
+        _singleflight_stats["upstream_calls"] += 1
+    else:
+        _singleflight_stats["coalesced_calls"] += 1
+    flight.waiters += 1
+    try:
+        return await asyncio.shield(flight.task)
+    finally:
+        flight.waiters -= 1
+        if not flight.waiters and not flight.task.done():
+            # Unlisted first, so a new caller starts fresh rather than joining a cancelled call.
+            if _inflight.get(key) is flight:
+                del _inflight[key]
+            flight.task.cancel()
+            _singleflight_stats["abandoned_calls"] += 1
+
+def singleflight_stats() -> dict:
+    return {**_singleflight_stats, "in_flight": len(_inflight)}
+
+async def stream_gemini_async(prompt: str, max_tokens: int = 300,
+                             timeout: float = GEMINI_TIMEOUT) -> AsyncIterator[str]:
+    # Yields text chunks as Gemini produces them. Yields nothing when the model
+    # is offline; upstream errors and timeouts propagate to the caller, which
+    # decides whether a partial answer is usable.
+    model = _model or await asyncio.to_thread(get_model)
+    if not model:
+        return
+    if not gemini_breaker.allow():
+        record_llm_call("stream", 0.0, "short_circuit")
+        return
+    deadline = time.monotonic() + timeout
+    # The breaker judges streams on time-to-first-token, not total length,
+    # counted from when a slot was free.
+    started = None
+    first_token = None
+    last_chunk = None
+    try:
+        async with _gemini_slot(deadline):
+            started = time.monotonic()
+            response = await asyncio.wait_for(
+                model.generate_content_async(
+                    prompt,
+                    generation_config=_generation_config(max_tokens),
+                    stream=True,
+                ),
+                max(deadline - time.monotonic(), 0),
+            )
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), max(deadline - time.monotonic(), 0))
+                except StopAsyncIteration:
+                    break
+                if first_token is None:
+                    first_token = time.monotonic() - started
+                last_chunk = chunk
+                if chunk.text:
+                    yield chunk.text
+    except (GeneratorExit, asyncio.CancelledError):
+        # The client went away mid-stream, which says nothing about Gemini.
+        if first_token is None:
+            gemini_breaker.release()
+        else:
+            gemini_breaker.record(True, first_token)
+        raise
+    except _QueueTimeout:
+        gemini_breaker.release()
+        record_llm_queue_timeout()
+        raise
+    except Exception as e:
+        if isinstance(e, asyncio.TimeoutError):
+            _record_timeout(time.monotonic() - started)
+        else:
+            gemini_breaker.record(False, time.monotonic() - started)
+        record_llm_call("stream", time.monotonic() - started,
+                        "timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+        raise
+    gemini_breaker.record(True, first_token if first_token is not None else time.monotonic() - started)
+    # The final chunk carries the usage totals for the whole stream.
+    record_llm_call("stream", first_token if first_token is not None else time.monotonic() - started,
+                    "ok", last_chunk)
+
 HINT_TEMPLATES = {
     "OVERLOAD": "What happens when current exceeds the safe limit? Think about I = V/R — what made the current so high?",
     "SHORT_CIRCUIT": "What does a very low resistance do to current flow? Can you recall the relationship I = V/R?",
@@ -61,31 +252,26 @@ ASK_AI_TEMPLATES = {
     "optics-bench": "The lens equation is 1/f = 1/v - 1/u. Try predicting image distance before measuring it.",
     "reaction-rate": "Reaction rate depends on temperature and concentration. Doubling temperature roughly doubles rate. Why?",
 }
-def generate_hint(simulation: str, trigger: str, failure_name: str = None,
-                   context: dict = None, student_message: str = None) -> dict:
-    
-
+def _hint_prompt(simulation: str, trigger: str, failure_name: str = None,
+                 context: dict = None, student_message: str = None) -> Optional[Tuple[str, int, str]]:
     if trigger == "failure" and failure_name:
-        prompt = f
-
-        ai_response = call_gemini(prompt, 150)
-        if ai_response:
-            return {"message": ai_response, "trigger": "failure", "level": 1}
-        return {
-            "message": HINT_TEMPLATES.get(failure_name, f"Something went wrong ({failure_name}). What caused it?"),
-            "trigger": "failure", "level": 1
-        }
+        prompt = f"""You are a Socratic science tutor for a {simulation} virtual lab.
+The student's experiment just failed with: {failure_name}.
+Current parameters: {json.dumps(context or {})}.
+
+Ask ONE short guiding question (max 2 sentences) that helps the student work out
+why this failure happened. Don't give the answer. Refer to their actual values."""
+        fallback = HINT_TEMPLATES.get(failure_name, f"Something went wrong ({failure_name}). What caused it?")
+        return prompt, 150, fallback
 
     elif trigger == "danger_zone":
-        prompt = f
-
-        ai_response = call_gemini(prompt, 150)
-        if ai_response:
-            return {"message": ai_response, "trigger": "danger_zone", "level": 1}
-        return {
-            "message": DANGER_TEMPLATES.get(simulation, "You're approaching dangerous values. What might happen?"),
-            "trigger": "danger_zone", "level": 1
-        }
+        prompt = f"""You are a Socratic science tutor for a {simulation} virtual lab.
+The student's parameters are approaching a dangerous region: {json.dumps(context or {})}.
+
+Warn them with ONE short guiding question (max 2 sentences) that makes them think
+about what will happen if they keep going. Don't lecture."""
+        fallback = DANGER_TEMPLATES.get(simulation, "You're approaching dangerous values. What might happen?")
+        return prompt, 150, fallback
 
     elif trigger == "ask_ai":
         prompt = f"""You are a Socratic science tutor for a {simulation} virtual lab.
@@ -94,16 +280,56 @@ Current parameters: {json.dumps(context or {})}.
 
 Give a helpful Socratic response (max 3 sentences). Guide them with a question, 
 don't give the direct answer. Relate to the current parameter values."""
+        fallback = ASK_AI_TEMPLATES.get(simulation, "Think about the relationship between your variables. What happens when you change one?")
+        return prompt, 200, fallback
 
-        ai_response = call_gemini(prompt, 200)
-        if ai_response:
-            return {"message": ai_response, "trigger": "ask_ai", "level": 1}
-        return {
-            "message": ASK_AI_TEMPLATES.get(simulation, "Think about the relationship between your variables. What happens when you change one?"),
-            "trigger": "ask_ai", "level": 1
-        }
+    return None
+async def generate_hint_async(simulation: str, trigger: str, failure_name: str = None,
+                              context: dict = None, student_message: str = None) -> dict:
+    tag_llm(simulation, trigger)
+    spec = _hint_prompt(simulation, trigger, failure_name, context, student_message)
+    if spec is None:
+        return {"message": "Try adjusting the parameters and observe what changes.", "trigger": trigger, "level": 1}
 
-    return {"message": "Try adjusting the parameters and observe what changes.", "trigger": trigger, "level": 1}
+    key = hint_key(simulation, trigger, failure_name, context, student_message)
+    cached = hint_cache.get(key)
+    if cached:
+        return {"message": cached, "trigger": trigger, "level": 1}
+
+    prompt, max_tokens, fallback = spec
+    ai_response = await call_gemini_async(prompt, max_tokens)
+    if ai_response:
+        hint_cache.put(key, ai_response)
+    return {"message": ai_response or fallback, "trigger": trigger, "level": 1}
+
+async def stream_hint_async(simulation: str, trigger: str, failure_name: str = None,
+                            context: dict = None, student_message: str = None) -> AsyncIterator[str]:
+    tag_llm(simulation, trigger)
+    spec = _hint_prompt(simulation, trigger, failure_name, context, student_message)
+    if spec is None:
+        yield "Try adjusting the parameters and observe what changes."
+        return
+
+    key = hint_key(simulation, trigger, failure_name, context, student_message)
+    cached = hint_cache.get(key)
+    if cached:
+        yield cached
+        return
+
+    prompt, max_tokens, fallback = spec
+    parts = []
+    try:
+        async for chunk in stream_gemini_async(prompt, max_tokens):
+            parts.append(chunk)
+            yield chunk
+    except Exception as e:
+        print(f"Gemini stream error: {e}")
+        if parts:
+            return
+    if parts:
+        hint_cache.put(key, "".join(parts).strip())
+    else:
+        yield fallback
 
 RESULT_TEMPLATES = {
     "ohm-law": "The experiment confirms Ohm's Law: current is directly proportional to voltage and inversely proportional to resistance (I = V/R).",
@@ -116,29 +342,154 @@ RESULT_TEMPLATES = {
     "periodic-table": "Periodic trends in atomic radius, ionization energy, and electronegativity were confirmed.",
     "mitosis": "All stages of mitotic division were observed in sequence from prophase to cytokinesis.",
 }
-def generate_report_result(simulation: str, observations: list, failures: list,
-                            duration: int, score: int) -> str:
-    
-    prompt = f"""You are a science lab report writer. Write a RESULT paragraph (3-4 sentences) 
+def _report_prompt(simulation: str, observations: list, failures: list,
+                   duration: int, score: int) -> str:
+    return f"""You are a science lab report writer. Write a RESULT paragraph (3-4 sentences) 
 for a {simulation} experiment.
 
-Student's observations: {json.dumps(observations[:3])}
+Student's observations: {json.dumps(prompt_summary(simulation, observations))}
 Failures triggered: {json.dumps(failures)}
 Duration: {duration}s, Score: {score}/100
 
 Write in third person past tense ("The experiment showed..."). 
 Be specific about the actual values observed. Include one key formula.
 Keep it under 80 words."""
-
-    ai_response = call_gemini(prompt, 200)
+async def generate_report_result_async(simulation: str, observations: list, failures: list,
+                                       duration: int, score: int) -> str:
+    tag_llm(simulation, "report")
+    ai_response = await call_gemini_async(_report_prompt(simulation, observations, failures, duration, score), 200)
     if ai_response:
         return ai_response
 
     return RESULT_TEMPLATES.get(simulation, "The observations matched expected theoretical values.")
 
-def generate_challenge(simulation: str, completed: list = None, skill_level: str = "intermediate") -> Optional[dict]:
-    
-    prompt = f"""Generate a physics/chemistry lab challenge for the "{simulation}" simulation.
+def _strip_fences(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_NUMBER = re.compile(r"^\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)")
+
+def _leading_number(value: Any) -> Any:
+    if isinstance(value, str):
+        match = _NUMBER.match(value)
+        if match:
+            return float(match.group(1))
+    return value
+
+def _close_truncated(text: str) -> str:
+    # Completions cut off by max_output_tokens are usually valid JSON minus
+    # their closing brackets. A string cut mid-way is dropped, not closed, so
+    # half a question never passes as a whole one.
+    stack, in_string, escaped, string_start = [], False, False, 0
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string, string_start = True, i
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text = text[:string_start].rstrip().rstrip(",")
+    return text + "".join(reversed(stack))
+
+def _json_candidates(text: str):
+    # Progressively more invasive local fixes; the first that parses wins.
+    text = _strip_fences(text)
+    yield text
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if starts:
+        start = min(starts)
+        end = text.rfind("}" if text[start] == "{" else "]")
+        text = text[start:end + 1] if end > start else text[start:]
+        yield text
+    text = _TRAILING_COMMA.sub(r"\1", text.replace("\u201c", '"').replace("\u201d", '"'))
+    yield text
+    yield re.sub(r"\bTrue\b", "true", re.sub(r"\bFalse\b", "false", re.sub(r"\bNone\b", "null", text)))
+    yield _TRAILING_COMMA.sub(r"\1", _close_truncated(text.rstrip().rstrip(",")))
+
+def _load_json(text: str) -> Tuple[Any, bool]:
+    for i, candidate in enumerate(_json_candidates(text)):
+        try:
+            return json.loads(candidate), i > 0
+        except json.JSONDecodeError:
+            continue
+    raise json.JSONDecodeError("no parseable JSON", text, 0)
+
+_structured_stats: Dict[Tuple[str, str], Counter] = {}
+def _count(kind: str, simulation: str, outcome: str):
+    # Keyed like the metrics labels, so client input can't grow the table.
+    _structured_stats.setdefault((kind, simulation_label(simulation)), Counter())[outcome] += 1
+
+def structured_output_stats() -> dict:
+    stats = {}
+    for (kind, simulation), counts in _structured_stats.items():
+        attempts = counts["attempts"]
+        stats.setdefault(kind, {})[simulation] = {
+            **counts,
+            "parse_failure_rate": round((counts["parse_failures"] + counts["invalid"]) / attempts, 3) if attempts else 0.0,
+        }
+    return stats
+
+def _structured_attempt(kind: str, simulation: str, text: str, validate) -> Tuple[Any, Optional[str]]:
+    _count(kind, simulation, "attempts")
+    try:
+        data, repaired = _load_json(text)
+    except json.JSONDecodeError:
+        _count(kind, simulation, "parse_failures")
+        print(f"Failed to parse Gemini {kind} JSON: {text[:100]}")
+        return None, "the reply was not valid JSON"
+    try:
+        value = validate(data)
+    except Exception as e:
+        # Whatever the reply broke (schema, compute expression, sweep), it is
+        # an invalid reply and goes through the normal retry path.
+        _count(kind, simulation, "invalid")
+        print(f"Rejected {simulation} {kind}: {e}")
+        return None, str(e) or type(e).__name__
+    _count(kind, simulation, "repaired" if repaired else "ok")
+    return value, None
+
+def _retry_prompt(prompt: str, reply: str, error: str) -> str:
+    return f"""{prompt}
+
+Your previous reply was rejected: {error}
+Previous reply: {reply[:600]}
+Return ONLY the corrected JSON."""
+
+async def _structured_call_async(kind: str, simulation: str, prompt: str, max_tokens: int, validate) -> Any:
+    # JSON-mode call, local repair, then at most STRUCTURED_RETRIES re-prompts
+    # that tell the model what was wrong. No reply at all (offline, breaker
+    # open, timeout) is not retried.
+    _count(kind, simulation, "calls")
+    attempt_prompt = prompt
+    for attempt in range(STRUCTURED_RETRIES + 1):
+        text = await call_gemini_async(attempt_prompt, max_tokens, json_mode=True)
+        if text is None:
+            break
+        value, error = _structured_attempt(kind, simulation, text, validate)
+        if error is None:
+            return value
+        if attempt < STRUCTURED_RETRIES:
+            _count(kind, simulation, "retries")
+            attempt_prompt = _retry_prompt(prompt, text, error)
+    _count(kind, simulation, "failed")
+    return None
+
+def _challenge_prompt(simulation: str, completed: list = None, skill_level: str = "intermediate") -> str:
+    return f"""Generate a physics/chemistry lab challenge for the "{simulation}" simulation.
 Skill level: {skill_level}
 Already completed challenge IDs: {json.dumps(completed or [])}
 
@@ -155,38 +506,235 @@ Return ONLY valid JSON (no markdown) with these exact keys:
   "proof": "Mathematical proof why the answer works",
   "fixed_params": {{"voltage": 6}},
   "compute": "inputs.voltage / inputs.resistance"
-}}"""
+}}
+"compute" must be a single arithmetic expression over inputs.<slider> using only
++ - * / ** %, numbers, and Math functions (sqrt, sin, cos, log10, exp, min, max...)."""
 
-    ai_response = call_gemini(prompt, 400)
-    if ai_response:
+def _validate_challenge(data: Any, simulation: str) -> dict:
+    if isinstance(data, list) and len(data) == 1:
+        data = data[0]
+    if not isinstance(data, dict):
+        raise ValueError("expected a single JSON object")
+    data = {_CAMEL.sub("_", k).lower(): v for k, v in data.items()}
+    # Models like to write "30 mA" or "6V" where a bare number is required.
+    for k in ("target_value", "tolerance"):
+        data[k] = _leading_number(data.get(k))
+    fixed = data.get("fixed_params")
+    data["fixed_params"] = {k: _leading_number(v) for k, v in fixed.items()} if isinstance(fixed, dict) else {}
+    if data["tolerance"] is None:
+        data["tolerance"] = 5
+    data.setdefault("target_unit", "")
+    # Set before registering, so the registry never holds the LLM's placeholder id.
+    data["id"] = new_challenge_id(simulation)
+    try:
+        challenge = ChallengeResponse(**data).dict()
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())) from None
+    compiled = compile_expression(challenge["compute"])
+    check = check_challenge(simulation, challenge, compiled.evaluate)
+    if check["checked"] and not check["solvable"]:
+        raise ValueError(f"{challenge['target_key']} = {challenge['target_value']} is unreachable "
+                         f"(closest reachable {check['closest']:.4g})")
+    challenge_registry.register(challenge, compiled)
+    return challenge
+
+async def generate_challenge_async(simulation: str, completed: list = None,
+                                   skill_level: str = "intermediate") -> Optional[dict]:
+    tag_llm(simulation, "challenge")
+    return await _structured_call_async("challenge", simulation, _challenge_prompt(simulation, completed, skill_level),
+                                        400, lambda data: _validate_challenge(data, simulation))
+
+VIVA_TEMPLATES = {
+    "ohm-law": [
+        "What is the physical significance of the slope of a V-I graph? How does it relate to resistance?",
+        "A wire has resistance 50Ω at 20°C. If current through it is 0.2A, calculate the voltage across it and the power dissipated.",
+        "Explain why Ohm's Law is not applicable to semiconductor devices like diodes and transistors.",
+    ],
+    "projectile-motion": [
+        "Derive the expression for maximum range of a projectile and prove that it occurs at 45°.",
+        "Two balls are thrown at 30° and 60° with the same speed. Compare their ranges, max heights, and time of flight.",
+        "How would the trajectory change if the same experiment were conducted on the Moon (g = 1.62 m/s²)?",
+    ],
+    "titration": [
+        "What is the Henderson-Hasselbalch equation? How is it used to calculate pH in the buffer region?",
+        "Why is phenolphthalein a suitable indicator for strong acid–strong base titrations? What is its pH range?",
+        "Calculate the pH when 20mL of 0.1M NaOH is added to 25mL of 0.1M HCl.",
+    ],
+    "optics-bench": [
+        "Derive the magnification formula m = v/u for a thin convex lens. When is the image inverted vs erect?",
+        "An object is placed 12 cm from a convex lens of focal length 15 cm. Find image position and nature.",
+        "Explain the concept of lens power (in dioptres) and how it relates to focal length.",
+    ],
+    "reaction-rate": [
+        "State the Arrhenius equation and explain the significance of activation energy (Ea).",
+        "If the rate constant doubles when temperature rises from 25°C to 35°C, calculate the activation energy.",
+        "Distinguish between zero-order, first-order, and second-order reactions with examples.",
+    ],
+    "logic-gates": [
+        "Prove using Boolean algebra that NAND gate is a universal gate by constructing AND, OR, and NOT from NAND gates only.",
+        "Simplify the Boolean expression: Y = A'B + AB' + AB using a Karnaugh map.",
+        "Design a half-adder circuit using only XOR and AND gates. Write its truth table.",
+    ],
+    "flame-test": [
+        "Explain the atomic theory behind flame test colours. Why do different elements produce different flame colours?",
+        "Why must the nichrome wire be cleaned with concentrated HCl before each flame test?",
+        "Sodium flame colour often masks other elements. How can you use a cobalt blue glass to identify potassium in the presence of sodium?",
+    ],
+    "periodic-table": [
+        "Explain the anomalous behavior of Boron and Silicon in the periodic table. Why are they called metalloids?",
+        "Why does ionization energy decrease from Nitrogen (N) to Oxygen (O) despite being in the same period?",
+        "Explain the concept of diagonal relationship with examples of Lithium-Magnesium and Beryllium-Aluminium.",
+    ],
+    "mitosis": [
+        "Compare mitosis and meiosis. List at least 5 key differences between the two types of cell division.",
+        "What is the significance of the mitotic spindle? What happens if spindle formation is inhibited by colchicine?",
+        "Explain why the cells at the root tip of an onion are ideal for observing mitosis in the laboratory.",
+    ],
+}
+
+DEFAULT_VIVA = [
+    "What are the key variables in this experiment?",
+    "How would you improve the accuracy of your measurements?",
+    "What are the real-world applications of this concept?",
+]
+
+def _fallback_viva(simulation: str) -> List[str]:
+    return challenge_bank.viva_set(simulation) or VIVA_TEMPLATES.get(simulation, DEFAULT_VIVA)
+
+def _viva_prompt(simulation: str, observations: list = None) -> str:
+    return f"""You are a lab examiner conducting a viva for a {simulation} experiment.
+Student's observations: {json.dumps(prompt_summary(simulation, observations))}
+
+Write 3 short viva questions that test conceptual understanding, from easy to hard.
+At least one should refer to the student's own observations.
+Return ONLY a JSON array of 3 strings (no markdown)."""
+
+def _validate_viva(data: Any) -> List[str]:
+    if isinstance(data, dict):
+        data = next((v for v in data.values() if isinstance(v, list)), None)
+    if not isinstance(data, list):
+        raise ValueError("expected a JSON array of 3 strings")
+    questions = [q.get("question") if isinstance(q, dict) else q for q in data]
+    questions = [q.strip() for q in questions if isinstance(q, str) and q.strip()]
+    if len(questions) < 3:
+        raise ValueError(f"expected 3 questions, got {len(questions)}")
+    return questions[:3]
+
+async def generate_viva_questions_async(simulation: str, observations: list = None) -> Optional[List[str]]:
+    tag_llm(simulation, "viva")
+    return await _structured_call_async("viva", simulation, _viva_prompt(simulation, observations), 300, _validate_viva)
+
+async def generate_report_async(simulation: str, observations: list, failures: list,
+                                duration: int, score: int, deadline: float = REPORT_DEADLINE) -> dict:
+    # Result and viva run side by side under one deadline. Whichever part
+    # misses it falls back to its template without holding up the other.
+    result_task = asyncio.ensure_future(
+        generate_report_result_async(simulation, observations, failures, duration, score))
+    viva_task = asyncio.ensure_future(generate_viva_questions_async(simulation, observations))
+    done, pending = await asyncio.wait({result_task, viva_task}, timeout=deadline)
+    for task in pending:
+        task.cancel()
+
+    result = result_task.result() if result_task in done else None
+    viva = viva_task.result() if viva_task in done else None
+    return {
+        "result": result or RESULT_TEMPLATES.get(simulation, "The observations matched expected theoretical values."),
+        "viva_questions": viva or _fallback_viva(simulation),
+    }
+
+def _batch_report_prompt(reports: List[dict]) -> str:
+    students = "\n".join(
+        f"""[{i}] simulation: {r["simulation"]}; observations: {json.dumps(prompt_summary(r["simulation"], r["observations"]))}; """
+        f"""failures: {json.dumps(r["failures"])}; duration: {r["duration"]}s; score: {r["score"]}/100"""
+        for i, r in enumerate(reports)
+    )
+    return f"""You are a science lab report writer and examiner. For EACH numbered student below,
+write a RESULT paragraph (3-4 sentences, third person past tense, specific about the
+actual values observed, one key formula, under 80 words) and 3 short viva questions
+that test conceptual understanding, from easy to hard.
+
+{students}
+
+Return ONLY a JSON array (no markdown) with one object per student:
+[{{"index": 0, "result": "...", "viva_questions": ["...", "...", "..."]}}]"""
+
+def _parse_batch_report(ai_response: Optional[str], count: int) -> Dict[int, dict]:
+    # Keeps every well-formed section; a student whose section is missing or
+    # malformed simply falls back on their own.
+    if not ai_response:
+        return {}
+    try:
+        sections, _ = _load_json(ai_response)
+    except json.JSONDecodeError:
+        print(f"Failed to parse Gemini batch report JSON: {ai_response[:100]}")
+        return {}
+    parsed = {}
+    for section in sections if isinstance(sections, list) else []:
+        if not isinstance(section, dict):
+            continue
+        index = section.get("index")
+        if not isinstance(index, int) or not 0 <= index < count or index in parsed:
+            continue
+        result = section.get("result")
         try:
-            text = ai_response.strip()
-            if text.startswith("```"):
-                text = text.split("\n", 1)[1] if "\n" in text else text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            return json.loads(text.strip())
-        except json.JSONDecodeError:
-            print(f"Failed to parse Gemini challenge JSON: {ai_response[:100]}")
+            viva = _validate_viva(section.get("viva_questions"))
+        except ValueError:
+            viva = None
+        parsed[index] = {
+            "result": result.strip() if isinstance(result, str) and result.strip() else None,
+            "viva_questions": viva,
+        }
+    return parsed
 
-    return None
+async def _generate_report_batch(reports: List[dict], timeout: float) -> List[dict]:
+    prompt = _batch_report_prompt(reports)
+    parsed = _parse_batch_report(await call_gemini_async(prompt, 350 * len(reports), timeout=timeout, json_mode=True), len(reports))
+    out = []
+    for i, r in enumerate(reports):
+        section = parsed.get(i, {})
+        out.append({
+            "result": section.get("result")
+                      or RESULT_TEMPLATES.get(r["simulation"], "The observations matched expected theoretical values."),
+            "viva_questions": section.get("viva_questions") or _fallback_viva(r["simulation"]),
+            "generated": bool(section.get("result")),
+        })
+    return out
 
-def generate_viva_questions(simulation: str, observations: list = None) -> Optional[List[str]]:
-    
-    prompt = f
+async def generate_reports_batch_async(reports: List[dict], batch_size: int = REPORT_BATCH_SIZE,
+                                       timeout: float = REPORT_BATCH_TIMEOUT) -> List[dict]:
+    # Packs batch_size students into each prompt and runs the batches side
+    # by side, so a class costs ceil(N / batch_size) round-trips instead of 2N.
+    # Students in a batch may be on different labs; the trigger says batch.
+    tag_llm("", "report_batch")
+    batches = [reports[i:i + batch_size] for i in range(0, len(reports), batch_size)]
+    results = await asyncio.gather(*(_generate_report_batch(b, timeout) for b in batches))
+    return [report for batch in results for report in batch]
 
-    ai_response = call_gemini(prompt, 300)
-    if ai_response:
+async def stream_report_async(simulation: str, observations: list, failures: list,
+                              duration: int, score: int,
+                              deadline: float = REPORT_DEADLINE) -> AsyncIterator[Tuple[str, Any]]:
+    tag_llm(simulation, "report")
+    # Streams ("result", chunk) events while the viva set is generated in the
+    # background, then emits a single ("viva_questions", [...]) event.
+    started = time.monotonic()
+    viva_task = asyncio.ensure_future(generate_viva_questions_async(simulation, observations))
+    streamed = False
+    try:
         try:
-            text = ai_response.strip()
-            if text.startswith("```"):
-                text = text.split("\n", 1)[1] if "\n" in text else text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            questions = json.loads(text.strip())
-            if isinstance(questions, list) and len(questions) >= 3:
-                return questions[:3]
-        except json.JSONDecodeError:
-            pass
+            prompt = _report_prompt(simulation, observations, failures, duration, score)
+            async for chunk in stream_gemini_async(prompt, 200, timeout=deadline):
+                streamed = True
+                yield "result", chunk
+        except Exception as e:
+            print(f"Gemini stream error: {e}")
+        if not streamed:
+            yield "result", RESULT_TEMPLATES.get(simulation, "The observations matched expected theoretical values.")
 
-    return None
+        remaining = max(deadline - (time.monotonic() - started), 0)
+        done, _ = await asyncio.wait({viva_task}, timeout=remaining)
+        viva = viva_task.result() if done else None
+        yield "viva_questions", viva or _fallback_viva(simulation)
+    finally:
+        # Also reached when the client disconnects at a yield.
+        if not viva_task.done():
+            viva_task.cancel()
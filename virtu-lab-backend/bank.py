@@ -0,0 +1,210 @@
+import asyncio
+import json
+import os
+import re
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+from config import (
+    GEMINI_API_KEY, BANK_PATH, BANK_SEED_PATH, BANK_DEPTH, BANK_MAX_PER_KEY,
+    BANK_REFILL_INTERVAL,
+)
+from expr import challenge_registry, ExpressionError
+
+DEFAULT_SKILL = "intermediate"
+SKILL_LEVELS = ("beginner", "intermediate", "advanced")
+
+def _snake(name: str) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+def _key(simulation: str, skill_level: Optional[str]) -> str:
+    return f"{simulation}|{skill_level or DEFAULT_SKILL}"
+
+def _catalog_labs() -> frozenset:
+    # catalog imports agent, which imports this module, so look it up late.
+    from catalog import SIMULATIONS
+    return frozenset(s["labKey"] for s in SIMULATIONS)
+
+def new_challenge_id(simulation: str) -> str:
+    # LLM ids are placeholders like "unique-id"; every generated entry gets its own.
+    return f"{simulation}-ai-{uuid.uuid4().hex[:8]}"
+
+class ChallengeBank:
+    # Validated challenges per (simulation, skill level) and viva sets per
+    # simulation, kept on disk so a restart serves immediately. The authored
+    # offline challenges are the floor every simulation can always fall back
+    # to; a background worker tops generated entries up to BANK_DEPTH for
+    # each key students actually ask for. Serving never calls the LLM.
+
+    def __init__(self, path: str = BANK_PATH, seed_path: str = BANK_SEED_PATH,
+                 depth: int = BANK_DEPTH, max_per_key: int = BANK_MAX_PER_KEY):
+        self.path = path
+        self.seed_path = seed_path
+        self.depth = depth
+        self.max_per_key = max_per_key
+        self._seeds: Dict[str, list] = {}
+        self._challenges: Dict[str, deque] = {}
+        self._viva: Dict[str, deque] = {}
+        self._wanted: set = set()
+        self._hungry: set = set()
+        self._labs: frozenset = frozenset()
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.seed_path) as f:
+                offline = json.load(f)
+            for simulation, challenges in offline.items():
+                self._seeds[simulation] = [self._add_seed(c) for c in challenges]
+            print(f"✅ Challenge bank seeded with {sum(map(len, self._seeds.values()))} offline challenges")
+        except FileNotFoundError:
+            print(f"⚠️  Offline challenges not found at {self.seed_path}; "
+                  "only generated challenges will be served until the bank fills")
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not load offline challenges: {e}")
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            saved = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not load challenge bank: {e}")
+            saved = {}
+        for key, challenges in saved.get("challenges", {}).items():
+            bucket = self._challenges[key] = deque(maxlen=self.max_per_key)
+            for challenge in challenges:
+                try:
+                    challenge_registry.register(challenge)
+                    bucket.append(challenge)
+                except ExpressionError:
+                    continue
+        for simulation, sets in saved.get("viva", {}).items():
+            self._viva[simulation] = deque(sets, maxlen=self.max_per_key)
+        self._labs = _catalog_labs() | set(self._seeds)
+        self._wanted.update(k for k in saved.get("wanted", []) if self._eligible(k))
+        self._wanted.update(_key(simulation, None) for simulation in self._seeds)
+
+    def _eligible(self, key: str) -> bool:
+        # Only refill keys for real labs and levels, whatever clients send.
+        simulation, _, skill_level = key.partition("|")
+        return simulation in self._labs and skill_level in SKILL_LEVELS
+
+    @staticmethod
+    def _add_seed(challenge: dict) -> dict:
+        seed = {_snake(k): v for k, v in challenge.items()}
+        # Some authored expressions (titration) are JS blocks the frontend runs
+        # itself; they are still served, just not evaluable server-side.
+        try:
+            challenge_registry.register(seed)
+        except ExpressionError:
+            pass
+        return seed
+
+    def take_challenge(self, simulation: str, skill_level: Optional[str] = None,
+                       completed: Optional[List[str]] = None) -> Optional[dict]:
+        self._load()
+        key = _key(simulation, skill_level)
+        if self._eligible(key):
+            self._wanted.add(key)
+        done = set(completed or [])
+        bucket = self._challenges.get(key, ())
+        for challenge in bucket:
+            if challenge["id"] not in done:
+                return challenge
+        # This student has been through every generated entry; grow the key
+        # past its target depth so the next request has something new.
+        if key in self._wanted:
+            self._hungry.add(key)
+        for challenge in self._seeds.get(simulation, ()):
+            if challenge["id"] not in done:
+                return challenge
+        return None
+
+    def viva_set(self, simulation: str) -> Optional[List[str]]:
+        self._load()
+        sets = self._viva.get(simulation)
+        if not sets:
+            return None
+        # Rotate so consecutive reports get different sets.
+        sets.rotate(-1)
+        return sets[-1]
+
+    def add_challenge(self, simulation: str, skill_level: Optional[str], challenge: dict):
+        bucket = self._challenges.setdefault(_key(simulation, skill_level), deque(maxlen=self.max_per_key))
+        if not challenge.get("id"):
+            challenge["id"] = new_challenge_id(simulation)
+        challenge_registry.register(challenge)
+        bucket.append(challenge)
+
+    def add_viva(self, simulation: str, questions: List[str]):
+        self._viva.setdefault(simulation, deque(maxlen=self.max_per_key)).append(questions)
+
+    def _next_gap(self) -> Optional[tuple]:
+        # The emptiest wanted key first, challenges before viva sets.
+        gaps = [(len(self._challenges.get(key, ())), "challenge", key) for key in self._wanted]
+        gaps += [(len(self._viva.get(key.split("|")[0], ())), "viva", key.split("|")[0]) for key in self._wanted]
+        gaps = [g for g in gaps if g[0] < self.depth]
+        gaps += [(self.depth, "challenge", key) for key in self._hungry]
+        return min(gaps) if gaps else None
+
+    def _snapshot(self) -> str:
+        return json.dumps({
+            "challenges": {k: list(v) for k, v in self._challenges.items()},
+            "viva": {k: list(v) for k, v in self._viva.items()},
+            "wanted": sorted(self._wanted),
+        })
+
+    def _write(self, data: str):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+    async def save(self):
+        try:
+            await asyncio.to_thread(self._write, self._snapshot())
+        except OSError as e:
+            print(f"⚠️  Could not save challenge bank: {e}")
+
+    async def run(self, make_challenge: Callable[..., Awaitable[Optional[dict]]],
+                  make_viva: Callable[..., Awaitable[Optional[List[str]]]]):
+        self._load()
+        if not GEMINI_API_KEY:
+            return
+        while True:
+            try:
+                made = await self._refill_one(make_challenge, make_viva)
+            except Exception as e:
+                # One bad generation must not end refilling for the process.
+                print(f"Challenge bank refill error: {e}")
+                made = None
+            if made:
+                await asyncio.sleep(BANK_REFILL_INTERVAL)
+            else:
+                # Nothing to do, Gemini is down or returned junk; back off.
+                await asyncio.sleep(BANK_REFILL_INTERVAL * 10)
+
+    async def _refill_one(self, make_challenge, make_viva):
+        gap = self._next_gap()
+        if gap is None:
+            return None
+        _, kind, key = gap
+        if kind == "challenge":
+            self._hungry.discard(key)
+            simulation, skill_level = key.split("|")
+            existing = [c["id"] for c in self._challenges.get(key, ())]
+            made = await make_challenge(simulation, existing, skill_level)
+            if made:
+                self.add_challenge(simulation, skill_level, made)
+        else:
+            made = await make_viva(key)
+            if made:
+                self.add_viva(key, made)
+        if made:
+            await self.save()
+        return made
+
+challenge_bank = ChallengeBank()
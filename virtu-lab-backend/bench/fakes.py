@@ -0,0 +1,198 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+
+# Stand-ins for the two network dependencies so the app can be driven at
+# classroom load without a Gemini key or a Supabase project. Both sample their
+# latency from a log-normal (median + spread), which is what real API latency
+# roughly looks like, and can fail a configurable fraction of calls.
+
+class Latency:
+    def __init__(self, median_ms: float, sigma: float = 0.5, error_rate: float = 0.0,
+                 hang_rate: float = 0.0, rng: random.Random = None):
+        self.median = median_ms / 1000
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.rng = rng or random.Random()
+
+    def sample(self) -> float:
+        # A "hang" is a call that never answers in time; the caller's own
+        # timeout is what ends it.
+        if self.hang_rate and self.rng.random() < self.hang_rate:
+            return 60.0
+        return self.median * self.rng.lognormvariate(0, self.sigma) if self.sigma else self.median
+
+    def fails(self) -> bool:
+        return bool(self.error_rate) and self.rng.random() < self.error_rate
+
+class FakeError(Exception):
+    pass
+
+# ---------------------------------------------------------------------------
+# Gemini
+# ---------------------------------------------------------------------------
+
+CHALLENGES = {
+    "ohm-law": ("current", 30, "mA", {"voltage": 6}, "inputs.voltage / inputs.resistance * 1000"),
+    "projectile-motion": ("range", 40, "m", {}, "inputs.velocity ** 2 * sin(2 * inputs.angle * pi / 180) / 9.81"),
+    "optics-bench": ("imageDistance", 30, "cm", {"focalLength": 15},
+                     "inputs.objectDistance * inputs.focalLength / (inputs.objectDistance - inputs.focalLength)"),
+    "reaction-rate": ("rate", 4, "", {}, "inputs.concentration * exp((inputs.temperature - 25) / 10) * 2"),
+}
+
+class _Usage:
+    def __init__(self, prompt: str, text: str):
+        self.prompt_token_count = len(prompt) // 4
+        self.candidates_token_count = len(text) // 4
+
+class _Response:
+    def __init__(self, prompt: str, text: str):
+        self.text = text
+        self.usage_metadata = _Usage(prompt, text)
+
+class _Stream:
+    def __init__(self, prompt: str, text: str, latency: Latency):
+        self.prompt = prompt
+        self.words = text.split(" ")
+        self.latency = latency
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.latency.sample())
+        for i in range(0, len(self.words), 4):
+            if i:
+                await asyncio.sleep(0.02)
+            text = " ".join(self.words[i:i + 4]) + " "
+            chunk = _Response(self.prompt, text)
+            yield chunk
+
+def fake_reply(prompt: str) -> str:
+    # Just enough prompt sniffing to answer each agent call in the shape it
+    # expects, so parsing and validation run on the hot path too.
+    indices = re.findall(r"^\[(\d+)\]", prompt, re.M)
+    if indices:
+        return json.dumps([
+            {"index": int(i), "result": "The experiment showed the expected relationship between the variables.",
+             "viva_questions": ["What did you measure?", "Why does it change?", "How would you improve it?"]}
+            for i in indices
+        ])
+    match = re.search(r'for the "([^"]+)" simulation', prompt)
+    if match:
+        simulation = match.group(1)
+        key, value, unit, fixed, compute = CHALLENGES.get(simulation, CHALLENGES["ohm-law"])
+        return json.dumps({
+            "id": "unique-id", "title": "Bench challenge", "description": f"Hit {value}{unit} of {key}.",
+            "target_key": key, "target_value": value, "target_unit": unit, "tolerance": 5,
+            "hint": "Use the governing formula.", "proof": "Follows from the formula.",
+            "fixed_params": fixed, "compute": compute,
+        })
+    if "viva" in prompt:
+        return json.dumps(["What is the key relationship?", "Why did the value change?", "What are sources of error?"])
+    return "What do you notice about how the output changes when you double the input? Think about the formula."
+
+class FakeGemini:
+    # Drop-in for the google.generativeai GenerativeModel the agent uses.
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self.calls += 1
+        time.sleep(min(self.latency.sample(), 30))
+        if self.latency.fails():
+            raise FakeError("fake Gemini 503")
+        return _Response(prompt, fake_reply(prompt))
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        self.calls += 1
+        if stream:
+            if self.latency.fails():
+                raise FakeError("fake Gemini 503")
+            return _Stream(prompt, fake_reply(prompt), self.latency)
+        await asyncio.sleep(self.latency.sample())
+        if self.latency.fails():
+            raise FakeError("fake Gemini 503")
+        return _Response(prompt, fake_reply(prompt))
+
+# ---------------------------------------------------------------------------
+# Supabase
+# ---------------------------------------------------------------------------
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+class _Query:
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table = table
+        self.rows_to_insert = None
+        self.columns = None
+        self.filters = []
+        self.order_by = None
+        self.limit_n = None
+        self.window = None
+
+    def insert(self, rows):
+        self.rows_to_insert = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def select(self, columns: str = "*"):
+        self.columns = None if columns == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def range(self, start, end):
+        self.window = (start, end)
+        return self
+
+    def execute(self):
+        self.client.latency_wait()
+        rows = self.client.tables.setdefault(self.table, [])
+        with self.client.lock:
+            if self.rows_to_insert is not None:
+                rows.extend(dict(r) for r in self.rows_to_insert)
+                return _Result(self.rows_to_insert)
+            out = [r for r in rows if all(r.get(c) == v for c, v in self.filters)]
+        if self.order_by:
+            column, desc = self.order_by
+            out.sort(key=lambda r: r.get(column) or "", reverse=desc)
+        if self.window:
+            out = out[self.window[0]:self.window[1] + 1]
+        if self.limit_n is not None:
+            out = out[:self.limit_n]
+        if self.columns:
+            out = [{c: r.get(c) for c in self.columns} for r in out]
+        return _Result([dict(r) for r in out])
+
+class FakeSupabase:
+    # Drop-in for the supabase-py client: table().select/insert/eq/order/
+    # limit/range().execute(), blocking like the real (sync) client does.
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.tables: dict = {}
+        self.lock = threading.Lock()
+
+    def latency_wait(self):
+        time.sleep(min(self.latency.sample(), 30))
+        if self.latency.fails():
+            raise FakeError("fake Supabase 500")
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
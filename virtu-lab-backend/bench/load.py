@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+# Classroom-burst load test. Runs the real FastAPI app in-process (httpx's
+# ASGI transport, no sockets) with Gemini and Supabase replaced by the fakes
+# in bench/fakes.py, replays a mixed student workload at rising concurrency
+# and reports throughput and p50/p95/p99 per route, optionally against a
+# stored baseline. Needs httpx on top of requirements.txt.
+#
+#   cd virtu-lab-backend
+#   python -m bench.load --stages 8,32,128 --duration 10 --save-baseline bench/baseline.json
+#   python -m bench.load --stages 8,32,128 --duration 10 --baseline bench/baseline.json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import numpy as np
+
+from bench.fakes import FakeGemini, FakeSupabase, Latency
+
+SIMULATIONS = ("ohm-law", "projectile-motion", "titration", "optics-bench", "reaction-rate")
+FAILURES = {
+    "ohm-law": "OVERLOAD", "projectile-motion": "ZERO_RANGE", "titration": "PH_EXTREME",
+    "optics-bench": "OVERSHOOT", "reaction-rate": "ENZYME_DENATURATION",
+}
+# Route -> share of traffic, roughly what a class mid-lab generates.
+MIX = {
+    "hint": 35, "hint_stream": 5, "report": 8, "challenge": 10,
+    "save": 25, "progress": 12, "health": 5,
+}
+
+def _request(kind: str, rng: random.Random, students: int):
+    student = f"bench-{rng.randrange(students)}"
+    simulation = rng.choice(SIMULATIONS)
+    voltage = rng.choice((5, 12, 24))
+    if kind == "hint":
+        return "POST", "/api/ai/hint", {
+            "simulation": simulation, "trigger": "failure", "failure_name": FAILURES[simulation],
+            "context": {"voltage": voltage, "resistance": rng.choice((10, 100))}, "student_id": student,
+        }
+    if kind == "hint_stream":
+        return "POST", "/api/ai/hint/stream", {"simulation": simulation, "trigger": "ask_ai",
+                                               "student_message": rng.choice(("why?", "what next?", "help"))}
+    if kind == "report":
+        return "POST", "/api/ai/report", {
+            "simulation": "ohm-law", "failures": [], "duration": rng.randrange(60, 900), "score": rng.randrange(100),
+            "observations": [{"voltage": v, "resistance": 100, "current": v * 10} for v in (2, 4, voltage)],
+        }
+    if kind == "challenge":
+        return "POST", "/api/ai/challenge", {"simulation": simulation, "completed_challenges": [],
+                                             "skill_level": "intermediate"}
+    if kind == "save":
+        return "POST", "/api/progress/save", {
+            "student_id": student, "simulation": simulation, "score": rng.randrange(100),
+            "duration": rng.randrange(30, 600), "mistakes": rng.randrange(5),
+            "failures": [{"name": FAILURES[simulation]}] if rng.random() < 0.3 else [], "observations": [],
+        }
+    if kind == "progress":
+        return "GET", f"/api/progress/{student}", None
+    return "GET", "/api/health", None
+
+async def _worker(client, rng, deadline, students, samples):
+    kinds, weights = zip(*MIX.items())
+    while time.perf_counter() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        method, path, body = _request(kind, rng, students)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            # Streams count until the last event, which is what the student waits for.
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        samples.append((kind, time.perf_counter() - started, ok))
+
+async def run_stage(app, concurrency: int, duration: float, students: int, seed: int) -> dict:
+    samples = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(
+            _worker(client, random.Random(seed * 1000 + i), deadline, students, samples)
+            for i in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+    return summarize(samples, elapsed)
+
+def summarize(samples: list, elapsed: float) -> dict:
+    routes = {}
+    for kind in sorted({k for k, _, _ in samples}):
+        latencies = np.array([s for k, s, _ in samples if k == kind]) * 1000
+        errors = sum(1 for k, _, ok in samples if k == kind and not ok)
+        p50, p95, p99 = np.percentile(latencies, (50, 95, 99))
+        routes[kind] = {"requests": len(latencies), "errors": errors,
+                        "p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1)}
+    all_ms = np.array([s for _, s, _ in samples]) * 1000 if samples else np.zeros(1)
+    p50, p95, p99 = np.percentile(all_ms, (50, 95, 99))
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "throughput_rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1),
+        "routes": routes,
+    }
+
+def print_stage(concurrency: int, result: dict):
+    print(f"\n== concurrency {concurrency}: {result['requests']} requests, {result['throughput_rps']} req/s, "
+          f"{result['errors']} errors, p50 {result['p50_ms']} / p95 {result['p95_ms']} / p99 {result['p99_ms']} ms")
+    print(f"   {'route':<12} {'reqs':>6} {'errs':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for kind, r in result["routes"].items():
+        print(f"   {kind:<12} {r['requests']:>6} {r['errors']:>5} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}")
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    # A regression is a route whose p95 grew, or a stage whose throughput
+    # dropped, by more than `tolerance` (a fraction) against the baseline.
+    regressions = []
+    for stage, result in results.items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base:
+            continue
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"c={stage} throughput {base['throughput_rps']} -> {result['throughput_rps']} req/s")
+        for kind, r in result["routes"].items():
+            b = base["routes"].get(kind)
+            if b and r["p95_ms"] > b["p95_ms"] * (1 + tolerance):
+                regressions.append(f"c={stage} {kind} p95 {b['p95_ms']} -> {r['p95_ms']} ms")
+    return regressions
+
+def install_fakes(args):
+    # Patch the module-level singletons the app reaches its dependencies
+    # through; everything between the route and the client runs for real.
+    import agent
+    import db
+
+    rng = random.Random(args.seed)
+    agent._model = FakeGemini(Latency(args.llm_ms, args.llm_sigma, args.llm_error_rate, args.llm_hang_rate, rng))
+    db._client = FakeSupabase(Latency(args.db_ms, args.db_sigma, args.db_error_rate, rng=rng))
+    db._storage = None
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Load-test the VirtuLab API against fake Gemini and Supabase.")
+    parser.add_argument("--stages", default="8,32,128", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per stage")
+    parser.add_argument("--students", type=int, default=300, help="distinct student ids in the traffic")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--llm-ms", type=float, default=700, help="median fake Gemini latency")
+    parser.add_argument("--llm-sigma", type=float, default=0.5, help="log-normal spread of Gemini latency")
+    parser.add_argument("--llm-error-rate", type=float, default=0.02)
+    parser.add_argument("--llm-hang-rate", type=float, default=0.005, help="calls that only end at the timeout")
+    parser.add_argument("--db-ms", type=float, default=40, help="median fake Supabase latency")
+    parser.add_argument("--db-sigma", type=float, default=0.4)
+    parser.add_argument("--db-error-rate", type=float, default=0.0)
+    parser.add_argument("--baseline", help="JSON from --save-baseline to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression as a fraction")
+    parser.add_argument("--save-baseline", help="write this run's results here")
+    return parser
+
+async def main(args) -> int:
+    install_fakes(args)
+    import main as app_module
+
+    app = app_module.app
+    results = {}
+    async with app.router.lifespan_context(app):
+        for concurrency in (int(c) for c in args.stages.split(",")):
+            result = await run_stage(app, concurrency, args.duration, args.students, args.seed)
+            results[str(concurrency)] = result
+            print_stage(concurrency, result)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"settings": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline")},
+                       "stages": results}, f, indent=2)
+        print(f"\nbaseline written to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\nno regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(build_parser().parse_args())))
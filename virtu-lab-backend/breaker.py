@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+from config import (
+    BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_ERROR_RATE,
+    BREAKER_SLOW_CALL, BREAKER_COOLDOWN, BREAKER_PROBES,
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    # Rolling-window breaker. Errors and calls slower than `slow_call` seconds
+    # both count as failures; once the failure rate over the window crosses
+    # `error_rate` the breaker opens and callers skip the network entirely.
+    # After `cooldown` seconds a few probe calls are let through to recover.
+
+    def __init__(self, name: str, window: float = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 error_rate: float = BREAKER_ERROR_RATE, slow_call: float = BREAKER_SLOW_CALL,
+                 cooldown: float = BREAKER_COOLDOWN, probes: int = BREAKER_PROBES):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.cooldown = cooldown
+        self.probes = probes
+        self.state = CLOSED
+        self._calls: deque = deque()  # (finished_at, failed, latency)
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._rejected = 0
+        self._trips = 0
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self._opened_at = now
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._trips += 1
+        print(f"⚠️  {self.name} circuit open — serving templates for {self.cooldown:.0f}s")
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                self._probes_in_flight = 0
+                self._probe_successes = 0
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes_in_flight < self.probes:
+                self._probes_in_flight += 1
+                return True
+            self._rejected += 1
+            return False
+
+    def record(self, ok: bool, latency: float):
+        failed = not ok or latency > self.slow_call
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if failed:
+                    self._open(now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.probes:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    print(f"✅ {self.name} circuit closed")
+                return
+            if self.state == OPEN:
+                return
+
+            self._calls.append((now, failed, latency))
+            self._trim(now)
+            if len(self._calls) >= self.min_calls:
+                failures = sum(1 for _, f, _ in self._calls if f)
+                if failures / len(self._calls) >= self.error_rate:
+                    self._open(now)
+
+    def release(self):
+        # The caller gave up before the outcome was known; frees a probe slot
+        # without counting the call either way.
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._trim(time.monotonic())
+            calls = len(self._calls)
+            failures = sum(1 for _, f, _ in self._calls if f)
+            latencies = sorted(lat for _, _, lat in self._calls)
+            return {
+                "state": self.state,
+                "window_calls": calls,
+                "error_rate": round(failures / calls, 3) if calls else 0.0,
+                "p50_latency": round(latencies[len(latencies) // 2], 3) if latencies else None,
+                "rejected": self._rejected,
+                "trips": self._trips,
+            }
+
+gemini_breaker = CircuitBreaker("Gemini")
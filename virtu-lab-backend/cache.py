@@ -0,0 +1,107 @@
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from math import floor, isfinite, log10
+from typing import Optional, Dict, Any, Tuple
+from config import (
+    HINT_CACHE_SIZE, HINT_CACHE_TTL, HINT_CACHE_PRECISION, HINT_CACHE_SIG_FIGS, HINT_CACHE_VARIANTS,
+)
+from physics import PARAM_RANGES
+
+def _bucket(value: float, precision: float) -> float:
+    # round(x, 0) stays a float, so a huge but finite value never overflows an int.
+    return round(round(value / precision, 0) * precision, 6)
+
+def _finite(value) -> bool:
+    # NaN, inf and ints too big for a float are keyed verbatim instead.
+    try:
+        return isfinite(float(value))
+    except OverflowError:
+        return False
+
+def _significant(value: float, figures: int) -> float:
+    if value == 0:
+        return 0.0
+    return round(value, figures - 1 - floor(log10(abs(value))))
+
+def _normalize_message(message: Optional[str]) -> str:
+    if not message:
+        return ""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", "", message.lower())).strip()
+
+def hint_key(simulation: str, trigger: str, failure_name: Optional[str],
+             context: Optional[Dict[str, Any]], student_message: Optional[str],
+             precision: float = HINT_CACHE_PRECISION, figures: int = HINT_CACHE_SIG_FIGS) -> Tuple:
+    # Slider values bucket to `precision` slider steps, so one bucket never
+    # spans states the hint would describe differently (titration baseVolume
+    # moves in 0.1 mL). Anything else, e.g. a derived reading, keeps `figures`
+    # significant figures whatever its magnitude.
+    ranges = PARAM_RANGES.get(simulation, {})
+    params = []
+    for name, value in sorted((context or {}).items()):
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and _finite(value):
+            if name in ranges:
+                params.append((name, _bucket(float(value), ranges[name][2] * precision)))
+            else:
+                params.append((name, _significant(float(value), figures)))
+        else:
+            params.append((name, str(value)))
+    return (simulation, trigger, failure_name or "", tuple(params), _normalize_message(student_message))
+
+class HintCache:
+    # TTL + LRU cache of LLM hints. Each key holds up to `variants` distinct
+    # answers; lookups count as misses until the pool is full so it keeps growing.
+
+    def __init__(self, max_size: int = HINT_CACHE_SIZE, ttl: float = HINT_CACHE_TTL,
+                 variants: int = HINT_CACHE_VARIANTS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self._entries: "OrderedDict[Tuple, Tuple[float, list]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None or len(entry[1]) < self.variants:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return random.choice(entry[1])
+
+    def put(self, key: Tuple, message: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = (time.monotonic(), [message])
+            elif message not in entry[1] and len(entry[1]) < self.variants:
+                entry[1].append(message)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+hint_cache = HintCache()
@@ -0,0 +1,67 @@
+import gzip
+import hashlib
+import json
+from fastapi import Request, Response
+from config import CATALOG_MAX_AGE, CATALOG_STALE_SECONDS
+from agent import (
+    HINT_TEMPLATES, DANGER_TEMPLATES, ASK_AI_TEMPLATES, RESULT_TEMPLATES,
+    VIVA_TEMPLATES, DEFAULT_VIVA,
+)
+
+# Tables that only change with a deploy, encoded, gzipped and hashed once at
+# import. Clients revalidate with If-None-Match and get a bodyless 304 while
+# their copy is current, which is what the PWA does on every launch.
+
+SIMULATIONS = [
+    {"name": "Ohm’s Law & Resistance", "subject": "Physics", "color": "bg-blue-500", "shadow": "shadow-blue-500/20", "icon": "/icon_ohm_law.png", "labKey": "ohm-law"},
+    {"name": "Projectile Motion", "subject": "Physics", "color": "bg-indigo-500", "shadow": "shadow-indigo-500/20", "icon": "/icon_projectile.png", "labKey": "projectile-motion"},
+    {"name": "Optics Bench", "subject": "Physics", "color": "bg-cyan-500", "shadow": "shadow-cyan-500/20", "icon": "/icon_optics.png", "labKey": "optics-bench"},
+    {"name": "Logic Gates", "subject": "Physics", "color": "bg-blue-600", "shadow": "shadow-blue-600/20", "icon": "/icon_logic_gates.png", "labKey": "logic-gates"},
+    {"name": "Acid-Base Titration", "subject": "Chemistry", "color": "bg-orange-500", "shadow": "shadow-orange-500/20", "icon": "/icon_titration.png", "labKey": "titration"},
+    {"name": "Flame Test", "subject": "Chemistry", "color": "bg-rose-500", "shadow": "shadow-rose-500/20", "icon": "/icon_flame_test.png", "labKey": "flame-test"},
+    {"name": "Periodic Table Trends", "subject": "Chemistry", "color": "bg-amber-500", "shadow": "shadow-amber-500/20", "icon": "/icon_periodic_table.png", "labKey": "periodic-table"},
+    {"name": "Rate of Reaction", "subject": "Chemistry", "color": "bg-orange-600", "shadow": "shadow-orange-600/20", "icon": "/icon_reaction_rate.png", "labKey": "reaction-rate"},
+    {"name": "Mitosis", "subject": "Biology", "color": "bg-green-600", "shadow": "shadow-green-600/20", "icon": "/icon_mitosis.png", "labKey": "mitosis"},
+]
+
+TEMPLATES = {
+    "hints": HINT_TEMPLATES,
+    "danger": DANGER_TEMPLATES,
+    "ask_ai": ASK_AI_TEMPLATES,
+    "results": RESULT_TEMPLATES,
+    "viva": VIVA_TEMPLATES,
+    "default_viva": DEFAULT_VIVA,
+}
+
+class StaticJSON:
+    def __init__(self, data, max_age: int = CATALOG_MAX_AGE, stale: int = CATALOG_STALE_SECONDS):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+        self.gzipped = gzip.compress(self.body, 9, mtime=0)
+        digest = hashlib.sha256(self.body).hexdigest()[:20]
+        # Each encoding is a different representation, so each gets its own tag.
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+        self.cache_control = f"public, max-age={max_age}, stale-while-revalidate={stale}"
+
+    def _matches(self, if_none_match: str) -> bool:
+        if if_none_match.strip() == "*":
+            return True
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return self.etag in tags or self.gzip_etag in tags
+
+    def respond(self, request: Request) -> Response:
+        gzip_ok = "gzip" in request.headers.get("accept-encoding", "")
+        headers = {
+            "ETag": self.gzip_etag if gzip_ok else self.etag,
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if self._matches(request.headers.get("if-none-match", "")):
+            return Response(status_code=304, headers=headers)
+        if gzip_ok:
+            headers["Content-Encoding"] = "gzip"
+            return Response(self.gzipped, media_type="application/json", headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
+
+simulations = StaticJSON(SIMULATIONS)
+templates = StaticJSON(TEMPLATES)
@@ -9,3 +9,49 @@ SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 PORT = int(os.getenv("PORT", "8000"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "8"))
+HINT_CACHE_SIZE = int(os.getenv("HINT_CACHE_SIZE", "2048"))
+HINT_CACHE_TTL = float(os.getenv("HINT_CACHE_TTL", "3600"))
+HINT_CACHE_PRECISION = float(os.getenv("HINT_CACHE_PRECISION", "1"))  # in slider steps
+HINT_CACHE_SIG_FIGS = int(os.getenv("HINT_CACHE_SIG_FIGS", "2"))
+HINT_CACHE_VARIANTS = int(os.getenv("HINT_CACHE_VARIANTS", "1"))
+REPORT_DEADLINE = float(os.getenv("REPORT_DEADLINE", "6"))
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL = float(os.getenv("BREAKER_SLOW_CALL", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+BREAKER_PROBES = int(os.getenv("BREAKER_PROBES", "2"))
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "100"))
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "1"))
+DB_JOURNAL_PATH = os.getenv("DB_JOURNAL_PATH", "experiments_journal.jsonl")
+DB_REPLAY_MAX_BACKOFF = float(os.getenv("DB_REPLAY_MAX_BACKOFF", "60"))
+STATS_CACHE_SIZE = int(os.getenv("STATS_CACHE_SIZE", "10000"))
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "300"))
+MEMORY_STORE_MAX_RECORDS = int(os.getenv("MEMORY_STORE_MAX_RECORDS", "50000"))
+MEMORY_STORE_MAX_PER_STUDENT = int(os.getenv("MEMORY_STORE_MAX_PER_STUDENT", "500"))
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "auto")  # auto | supabase | sqlite | memory
+SQLITE_PATH = os.getenv("SQLITE_PATH", "virtulab.db")
+TELEMETRY_BUCKET_SECONDS = int(os.getenv("TELEMETRY_BUCKET_SECONDS", "60"))
+TELEMETRY_RETENTION_MINUTES = int(os.getenv("TELEMETRY_RETENTION_MINUTES", "1440"))
+DASHBOARD_TICK_SECONDS = float(os.getenv("DASHBOARD_TICK_SECONDS", "1"))
+DASHBOARD_QUEUE_SIZE = int(os.getenv("DASHBOARD_QUEUE_SIZE", "32"))
+PHYSICS_GRID_POINTS = int(os.getenv("PHYSICS_GRID_POINTS", "1000"))
+OBSERVATION_TOLERANCE = float(os.getenv("OBSERVATION_TOLERANCE", "5"))
+OBSERVATION_STORE_POINTS = int(os.getenv("OBSERVATION_STORE_POINTS", "200"))
+OBSERVATION_PROMPT_POINTS = int(os.getenv("OBSERVATION_PROMPT_POINTS", "8"))
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "300"))
+CATALOG_STALE_SECONDS = int(os.getenv("CATALOG_STALE_SECONDS", "86400"))
+EXPR_CACHE_SIZE = int(os.getenv("EXPR_CACHE_SIZE", "1024"))
+EXPR_MAX_INPUT_POINTS = int(os.getenv("EXPR_MAX_INPUT_POINTS", "1000"))
+BANK_PATH = os.getenv("BANK_PATH", "challenge_bank.json")
+BANK_SEED_PATH = os.getenv("BANK_SEED_PATH", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "virtu-lab-frontend", "public", "offline_challenges.json"))
+BANK_DEPTH = int(os.getenv("BANK_DEPTH", "5"))
+BANK_MAX_PER_KEY = int(os.getenv("BANK_MAX_PER_KEY", "50"))
+BANK_REFILL_INTERVAL = float(os.getenv("BANK_REFILL_INTERVAL", "2"))
+REPORT_BATCH_SIZE = int(os.getenv("REPORT_BATCH_SIZE", "8"))
+REPORT_BATCH_TIMEOUT = float(os.getenv("REPORT_BATCH_TIMEOUT", "20"))
+REPORT_BATCH_MAX = int(os.getenv("REPORT_BATCH_MAX", "60"))
+STRUCTURED_RETRIES = int(os.getenv("STRUCTURED_RETRIES", "1"))
@@ -1,7 +1,19 @@
 
-from config import SUPABASE_URL, SUPABASE_KEY
+from config import (
+    SUPABASE_URL, SUPABASE_KEY, DB_BATCH_SIZE, DB_FLUSH_INTERVAL, DB_JOURNAL_PATH, DB_REPLAY_MAX_BACKOFF,
+    STATS_CACHE_SIZE, STATS_CACHE_TTL,
+    MEMORY_STORE_MAX_RECORDS, MEMORY_STORE_MAX_PER_STUDENT, STORAGE_BACKEND, SQLITE_PATH,
+)
+from storage import ExperimentStorage, MemoryStorage, SupabaseStorage, SQLiteStorage
+from metrics import db_span
+from observations import compact
+from collections import OrderedDict
 from datetime import datetime, timezone
 import json
+import os
+from typing import Optional
+import threading
+import time
 
 _client = None
 def get_client():
@@ -20,40 +32,254 @@ def get_client():
     except Exception as e:
         print(f"⚠️  Supabase connection failed: {e}")
         return None
-_memory_store: dict = {"experiments": [], "students": {}}
-def save_experiment(record: dict) -> bool:
-    
-    record["timestamp"] = record.get("timestamp") or datetime.now(timezone.utc).isoformat()
-    client = get_client()
-    if client:
+_storage = None
+_storage_lock = threading.Lock()
+def get_storage() -> ExperimentStorage:
+    # STORAGE_BACKEND=auto uses Supabase when it is configured and reachable,
+    # otherwise the volatile in-memory store.
+    global _storage
+    if _storage is not None:
+        return _storage
+    with _storage_lock:
+        if _storage is None:
+            backend = STORAGE_BACKEND.lower()
+            client = get_client() if backend in ("auto", "supabase") else None
+            if client:
+                _storage = SupabaseStorage(client)
+            elif backend == "sqlite":
+                _storage = SQLiteStorage(SQLITE_PATH)
+                print(f"✅ SQLite storage at {SQLITE_PATH}")
+            else:
+                _storage = MemoryStorage(MEMORY_STORE_MAX_RECORDS, MEMORY_STORE_MAX_PER_STUDENT)
+    return _storage
+
+def _read_rows(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+class _WriteBehindQueue:
+    # Buffers experiment rows for durable backends and bulk-inserts them from a
+    # background thread once DB_BATCH_SIZE rows are waiting or DB_FLUSH_INTERVAL
+    # has passed. Batches that fail to insert are appended to an on-disk
+    # journal, which is replayed after a successful flush, backing off while
+    # the store keeps refusing it. Journaled rows stay readable meanwhile.
+
+    def __init__(self, batch_size: int, flush_interval: float, journal_path: str,
+                 max_backoff: float = DB_REPLAY_MAX_BACKOFF):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal_path = journal_path
+        self.max_backoff = max_backoff
+        self._pending: list = []
+        self._in_flight: list = []
+        # In-memory mirrors of the journal and of a replay in progress.
+        self._journaled = _read_rows(journal_path)
+        self._replaying = _read_rows(journal_path + ".replay")
+        self._replay_delay = 0.0
+        self._next_replay = 0.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+
+    def _start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, row: dict):
+        with self._lock:
+            if not self._running:
+                self._start()
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+
+    def pending_for(self, student_id: str) -> list:
+        with self._lock:
+            rows = self._replaying + self._journaled + self._in_flight + self._pending
+            return [r for r in rows if r.get("student_id") == student_id]
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._in_flight = batch
+            try:
+                if not batch or self._insert(batch):
+                    if batch:
+                        # The store just took a batch; don't sit out a backoff.
+                        self._next_replay = 0.0
+                    if time.monotonic() >= self._next_replay:
+                        self._replay_journal()
+            except Exception as e:
+                print(f"DB flush error: {e}")
+            finally:
+                with self._lock:
+                    self._in_flight = []
+
+    @db_span("flush")
+    def _insert(self, rows: list) -> bool:
+        storage = get_storage()
+        done = 0
         try:
-            client.table("experiments").insert(record).execute()
+            while done < len(rows):
+                storage.insert_many(rows[done:done + self.batch_size])
+                done += self.batch_size
             return True
         except Exception as e:
-            print(f"DB save error: {e}")
+            print(f"DB save error: {e} — journaling {len(rows) - done} rows")
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                for row in rows[done:]:
+                    f.write(json.dumps(row) + "\n")
+            with self._lock:
+                self._journaled.extend(rows[done:])
+            return False
 
-    _memory_store["experiments"].append(record)
-    return True
-def get_student_experiments(student_id: str) -> list:
+    def _replay_journal(self):
+        # Only the flush thread touches the journal. It is moved aside before
+        # replaying so rows that fail again can be re-journaled by _insert; a
+        # leftover .replay file from a crash is picked up first.
+        replaying = self.journal_path + ".replay"
+        if not os.path.exists(replaying):
+            if not os.path.exists(self.journal_path):
+                return
+            os.replace(self.journal_path, replaying)
+            with self._lock:
+                self._replaying, self._journaled = self._replaying + self._journaled, []
+        rows = _read_rows(replaying)
+        replayed = self._insert(rows) if rows else False
+        os.remove(replaying)
+        with self._lock:
+            self._replaying = []
+        if replayed:
+            self._replay_delay = 0.0
+            self._next_replay = 0.0
+            print(f"✅ Replayed {len(rows)} journaled experiments")
+        elif rows:
+            self._replay_delay = min(max(self._replay_delay * 2, self.flush_interval), self.max_backoff)
+            self._next_replay = time.monotonic() + self._replay_delay
+
+    def close(self):
+        self._running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush()
+
+_write_queue = _WriteBehindQueue(DB_BATCH_SIZE, DB_FLUSH_INTERVAL, DB_JOURNAL_PATH)
+# Per-student running totals, folded in by save_experiment so stats rarely
+# need to rescan history. A student's aggregate is loaded from storage when
+# first seen and again once it is STATS_CACHE_TTL old, which picks up rows
+# other workers wrote; at most STATS_CACHE_SIZE students are kept.
+_stats: "OrderedDict[str, tuple]" = OrderedDict()  # student_id -> (loaded_at, aggregate)
+_stats_lock = threading.Lock()
+def _fold(agg: dict, record: dict):
+    score = record.get("score", 0) or 0
+    agg["count"] += 1
+    agg["time"] += record.get("duration", 0) or 0
+    agg["score_sum"] += score
+    sim = agg["sims"].setdefault(record.get("simulation", "unknown"), [0, 0])
+    sim[0] += 1
+    sim[1] += score
+
+def _load_history(student_id: str) -> Optional[list]:
+    try:
+        return get_storage().history(student_id)
+    except Exception as e:
+        print(f"DB read error: {e}")
+        return None
+
+def _merge_unsaved(stored: list, student_id: str) -> list:
+    # Rows still queued or journaled aren't in storage yet but are the student's.
+    pending = _write_queue.pending_for(student_id)
+    seen = {(e.get("timestamp"), e.get("simulation")) for e in pending}
+    return pending + [e for e in stored if (e.get("timestamp"), e.get("simulation")) not in seen]
+
+def _cached_aggregate(student_id: str, now: float) -> Optional[dict]:
+    # Caller holds _stats_lock.
+    entry = _stats.get(student_id)
+    if entry is not None and now - entry[0] < STATS_CACHE_TTL:
+        _stats.move_to_end(student_id)
+        return entry[1]
+    return None
+
+def _student_aggregate(student_id: str) -> dict:
+    now = time.monotonic()
+    with _stats_lock:
+        agg = _cached_aggregate(student_id, now)
+    if agg is not None:
+        return agg
+    loaded = {"count": 0, "time": 0, "score_sum": 0, "sims": {}}
+    history = _load_history(student_id)
+    for record in _merge_unsaved(history or [], student_id):
+        _fold(loaded, record)
+    if history is None:
+        # Not cached, so the next request tries storage again.
+        return loaded
+    with _stats_lock:
+        entry = _stats.get(student_id)
+        if entry is not None and entry[0] >= now:
+            return entry[1]
+        _stats[student_id] = (now, loaded)
+        _stats.move_to_end(student_id)
+        while len(_stats) > STATS_CACHE_SIZE:
+            _stats.popitem(last=False)
+    return loaded
+
+@db_span("save_experiment")
+def save_experiment(record: dict) -> bool:
     
-    client = get_client()
-    if client:
-        try:
-            result = client.table("experiments") \
-                .select("*") \
-                .eq("student_id", student_id) \
-                .order("timestamp", desc=True) \
-                .limit(50) \
-                .execute()
-            return result.data or []
-        except Exception as e:
-            print(f"DB read error: {e}")
+    record["timestamp"] = record.get("timestamp") or datetime.now(timezone.utc).isoformat()
+    # Stored columnar and downsampled; see observations.py.
+    record["observations"] = compact(record.get("observations") or [])
+    # Only a cached aggregate is kept current; loading one here would read the
+    # student's whole history on the request path. Without one, the next stats
+    # read builds it, queued rows included.
+    with _stats_lock:
+        agg = _cached_aggregate(record.get("student_id", ""), time.monotonic())
+        if agg is not None:
+            _fold(agg, record)
+
+    storage = get_storage()
+    if storage.durable:
+        _write_queue.enqueue(record)
+    else:
+        storage.insert_many([record])
+    return True
 
-    return [e for e in _memory_store["experiments"] if e.get("student_id") == student_id]
+def flush_experiments():
+    _write_queue.close()
+@db_span("get_student_experiments")
+def get_student_experiments(student_id: str, limit: int = 50) -> list:
+    
+    storage = get_storage()
+    if not storage.durable:
+        return storage.recent(student_id, limit)
+    pending = _write_queue.pending_for(student_id)
+    try:
+        stored = storage.recent(student_id, limit)
+    except Exception as e:
+        print(f"DB read error: {e}")
+        stored = []
+    # A batch that has just been flushed can briefly show up on both sides.
+    seen = {(e.get("timestamp"), e.get("simulation")) for e in pending}
+    rows = pending + [e for e in stored if (e.get("timestamp"), e.get("simulation")) not in seen]
+    return sorted(rows, key=lambda e: e.get("timestamp") or "", reverse=True)[:limit]
+@db_span("get_student_stats")
 def get_student_stats(student_id: str) -> dict:
     
-    experiments = get_student_experiments(student_id)
-    if not experiments:
+    agg = _student_aggregate(student_id)
+    if not agg["count"]:
         return {
             "student_id": student_id,
             "total_experiments": 0,
@@ -65,31 +291,23 @@ def get_student_stats(student_id: str) -> dict:
             "weaknesses": [],
         }
 
-    total_time = sum(e.get("duration", 0) for e in experiments)
-    scores = [e.get("score", 0) for e in experiments]
-    avg_score = sum(scores) / len(scores) if scores else 0
-
-    sim_counts = {}
-    sim_scores = {}
-    for e in experiments:
-        sim = e.get("simulation", "unknown")
-        sim_counts[sim] = sim_counts.get(sim, 0) + 1
-        if sim not in sim_scores:
-            sim_scores[sim] = []
-        sim_scores[sim].append(e.get("score", 0))
+    with _stats_lock:
+        count, total_time, score_sum = agg["count"], agg["time"], agg["score_sum"]
+        sims = {s: tuple(v) for s, v in agg["sims"].items()}
 
-    sim_averages = {s: sum(sc) / len(sc) for s, sc in sim_scores.items() if sc}
+    sim_counts = {s: c for s, (c, _) in sims.items()}
+    sim_averages = {s: total / c for s, (c, total) in sims.items() if c}
     sorted_sims = sorted(sim_averages.items(), key=lambda x: x[1], reverse=True)
     strengths = [s[0] for s in sorted_sims[:3] if s[1] >= 70]
     weaknesses = [s[0] for s in sorted_sims[-3:] if s[1] < 70]
 
     return {
         "student_id": student_id,
-        "total_experiments": len(experiments),
+        "total_experiments": count,
         "total_time": total_time,
-        "avg_score": round(avg_score, 1),
+        "avg_score": round(score_sum / count, 1),
         "simulations_completed": sim_counts,
-        "recent_experiments": experiments[:10],
+        "recent_experiments": get_student_experiments(student_id, limit=10),
         "strengths": strengths,
         "weaknesses": weaknesses,
     }
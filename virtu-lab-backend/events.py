@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from collections import Counter
+from typing import Optional
+from config import DASHBOARD_TICK_SECONDS, DASHBOARD_QUEUE_SIZE
+from telemetry import DEFAULT_COHORT, failure_names
+
+class CohortBus:
+    # In-process pub/sub for the teacher dashboard. publish() may be called
+    # from any thread (sync handlers run in the threadpool); it only folds the
+    # event into the cohort's pending diff. Once per tick the diffs are handed
+    # to every subscriber of that cohort as one coalesced batch.
+
+    def __init__(self, tick: float = DASHBOARD_TICK_SECONDS, queue_size: int = DASHBOARD_QUEUE_SIZE):
+        self.tick = tick
+        self.queue_size = queue_size
+        self._pending: dict = {}
+        self._subscribers: dict = {}
+        self._lock = threading.Lock()
+
+    def _diff(self, cohort: str) -> Optional[dict]:
+        if cohort not in self._subscribers:
+            return None
+        diff = self._pending.get(cohort)
+        if diff is None:
+            diff = self._pending[cohort] = {"experiments": {}, "failures": Counter(), "hint_failures": Counter()}
+        return diff
+
+    def publish_experiment(self, cohort: Optional[str], record: dict):
+        with self._lock:
+            diff = self._diff(cohort or DEFAULT_COHORT)
+            if diff is None:
+                return
+            simulation = record.get("simulation")
+            # Only a student's latest score matters to the dashboard.
+            diff["experiments"][record.get("student_id")] = {
+                "student_id": record.get("student_id"),
+                "simulation": simulation,
+                "score": record.get("score"),
+                "duration": record.get("duration"),
+                "timestamp": record.get("timestamp"),
+            }
+            for name in failure_names(record.get("failures")):
+                diff["failures"][(simulation, name)] += 1
+
+    def publish_hint_failure(self, cohort: Optional[str], simulation: str, failure_name: str):
+        with self._lock:
+            diff = self._diff(cohort or DEFAULT_COHORT)
+            if diff is not None:
+                diff["hint_failures"][(simulation, failure_name.upper())] += 1
+
+    def subscribe(self, cohort: str) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(cohort, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, cohort: str, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(cohort)
+            if subscribers:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[cohort]
+                    self._pending.pop(cohort, None)
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._subscribers.values())
+
+    def _fan_out(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            targets = {cohort: list(self._subscribers.get(cohort, ())) for cohort in pending}
+        for cohort, diff in pending.items():
+            batch = {
+                "cohort": cohort,
+                "experiments": list(diff["experiments"].values()),
+                "failures": [{"simulation": s, "failure": f, "count": n} for (s, f), n in diff["failures"].items()],
+                "hint_failures": [{"simulation": s, "failure": f, "count": n} for (s, f), n in diff["hint_failures"].items()],
+            }
+            for queue in targets[cohort]:
+                # A teacher that stops reading loses its oldest batches, never
+                # holds up the others.
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(batch)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self._fan_out()
+
+cohort_bus = CohortBus()
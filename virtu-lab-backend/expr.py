@@ -0,0 +1,191 @@
+import ast
+import re
+import threading
+from collections import OrderedDict
+from functools import reduce
+from typing import Dict, Optional, Union
+import numpy as np
+from config import EXPR_CACHE_SIZE
+from physics import DEFAULTS
+
+# Functions and constants a challenge `compute` expression may use. Both the
+# bare name and the JS spelling (Math.sin, Math.PI) are accepted.
+FUNCTIONS = {
+    "sin": np.sin, "cos": np.cos, "tan": np.tan,
+    "asin": np.arcsin, "acos": np.arccos, "atan": np.arctan, "atan2": np.arctan2,
+    "sqrt": np.sqrt, "exp": np.exp, "log": np.log, "log10": np.log10, "log2": np.log2,
+    "abs": np.abs, "pow": np.power,
+    "min": lambda *args: reduce(np.minimum, args), "max": lambda *args: reduce(np.maximum, args),
+    "floor": np.floor, "ceil": np.ceil, "round": np.round,
+}
+# (fewest, most) arguments per function; anything not listed takes exactly one.
+# Checked at compile time: numpy ufuncs read extra positional arguments as
+# `out=` and would write into the inputs.
+ARITY = {"atan2": (2, 2), "pow": (2, 2), "min": (1, 8), "max": (1, 8)}
+CONSTANTS = {"pi": np.pi, "PI": np.pi, "e": np.e, "E": np.e, "g": 9.81}
+
+_ALLOWED_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.UAdd, ast.USub)
+_DEFAULT_RE = re.compile(r"inputs\.(\w+)\s*\?\?\s*(-?\d+(?:\.\d+)?)(?=\s*(?:[),]|$))")
+_MAX_LENGTH = 500
+
+class ExpressionError(ValueError):
+    pass
+
+class _Inputs:
+    __slots__ = ("_values", "_defaults")
+
+    def __init__(self, values: dict, defaults: dict):
+        self._values = values
+        self._defaults = defaults
+
+    def __getattr__(self, name: str):
+        if name in self._values:
+            return self._values[name]
+        if name in self._defaults:
+            return self._defaults[name]
+        raise ExpressionError(f"missing input '{name}'")
+
+class CompiledExpression:
+    def __init__(self, source: str, code, variables: set, defaults: dict, literals: dict):
+        self.source = source
+        self.variables = variables
+        self.defaults = defaults
+        self._code = code
+        self._literals = literals
+
+    def evaluate(self, inputs: Dict[str, Union[float, np.ndarray, list]],
+                 max_points: Optional[int] = None) -> Union[float, np.ndarray]:
+        # Scalars in, float out; any array input broadcasts and returns an array.
+        # Everything is a numpy float, so overflow and division by zero come
+        # out as inf/nan instead of raising or running unbounded int arithmetic.
+        try:
+            values = {k: np.asarray(v, dtype=float) if isinstance(v, (list, tuple, np.ndarray)) else np.float64(v)
+                      for k, v in inputs.items() if v is not None}
+            # What the inputs broadcast to is how much work the expression does.
+            points = int(np.prod(np.broadcast_shapes(*(np.shape(v) for v in values.values()))))
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ExpressionError(f"invalid input: {e}") from None
+        if max_points is not None and points > max_points:
+            raise ExpressionError(f"at most {max_points} points per evaluation")
+        namespace = {"__builtins__": {}, "inputs": _Inputs(values, self.defaults),
+                     **FUNCTIONS, **_NP_CONSTANTS, **self._literals}
+        try:
+            with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                result = eval(self._code, namespace)
+        except ArithmeticError as e:
+            raise ExpressionError(f"cannot evaluate: {e}") from None
+        return float(result) if np.ndim(result) == 0 else np.asarray(result, dtype=float)
+
+_NP_CONSTANTS = {k: np.float64(v) for k, v in CONSTANTS.items()}
+
+class _Literals(ast.NodeTransformer):
+    # Numeric literals become names bound to numpy floats at evaluation time
+    # (compile() only accepts plain Python constants).
+    def __init__(self):
+        self.values = {}
+
+    def visit_Constant(self, node: ast.Constant):
+        name = f"_k{len(self.values)}"
+        self.values[name] = np.float64(node.value)
+        return ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node)
+
+def _validate(node: ast.AST, variables: set):
+    if isinstance(node, ast.Expression):
+        return _validate(node.body, variables)
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ExpressionError("only numeric literals are allowed")
+        return
+    if isinstance(node, ast.BinOp):
+        if not isinstance(node.op, _ALLOWED_OPS):
+            raise ExpressionError(f"operator {type(node.op).__name__} is not allowed")
+        _validate(node.left, variables)
+        _validate(node.right, variables)
+        return
+    if isinstance(node, ast.UnaryOp):
+        if not isinstance(node.op, _ALLOWED_OPS):
+            raise ExpressionError(f"operator {type(node.op).__name__} is not allowed")
+        _validate(node.operand, variables)
+        return
+    if isinstance(node, ast.Attribute):
+        if isinstance(node.value, ast.Name) and node.value.id == "inputs" and not node.attr.startswith("_"):
+            variables.add(node.attr)
+            return
+        raise ExpressionError("only inputs.<name> attributes are allowed")
+    if isinstance(node, ast.Name):
+        if node.id in CONSTANTS:
+            return
+        raise ExpressionError(f"unknown name '{node.id}'")
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise ExpressionError("only math functions can be called")
+        fewest, most = ARITY.get(node.func.id, (1, 1))
+        if node.keywords or not fewest <= len(node.args) <= most:
+            expected = str(fewest) if fewest == most else f"{fewest} to {most}"
+            raise ExpressionError(f"{node.func.id}() takes {expected} argument(s)")
+        for arg in node.args:
+            if isinstance(arg, ast.Starred):
+                raise ExpressionError(f"bad arguments to {node.func.id}()")
+            _validate(arg, variables)
+        return
+    raise ExpressionError(f"{type(node).__name__} is not allowed")
+
+def compile_expression(source: str) -> CompiledExpression:
+    if not isinstance(source, str) or not source.strip():
+        raise ExpressionError("empty expression")
+    if len(source) > _MAX_LENGTH:
+        raise ExpressionError("expression too long")
+
+    # Translate the JS dialect the frontend uses: `inputs.x ?? 6` supplies a
+    # default, `Math.sin` / `Math.PI` map onto the whitelisted names.
+    defaults = {name: float(value) for name, value in _DEFAULT_RE.findall(source)}
+    text = _DEFAULT_RE.sub(lambda m: f"inputs.{m.group(1)}", source)
+    text = re.sub(r"\bMath\.", "", text)
+    try:
+        tree = ast.parse(text.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"cannot parse expression: {e.msg}") from None
+
+    variables: set = set()
+    _validate(tree, variables)
+    for name in variables:
+        if name not in defaults and name in DEFAULTS:
+            defaults[name] = float(DEFAULTS[name])
+    defaults = {k: np.float64(v) for k, v in defaults.items()}
+    literals = _Literals()
+    tree = ast.fix_missing_locations(literals.visit(tree))
+    return CompiledExpression(source, compile(tree, "<compute>", "eval"), variables, defaults, literals.values)
+
+class _ChallengeRegistry:
+    # LRU of compiled `compute` expressions keyed by challenge id, together
+    # with the challenge itself so later evaluations can check tolerance.
+
+    def __init__(self, max_size: int = EXPR_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, challenge: dict, compiled: Optional[CompiledExpression] = None) -> CompiledExpression:
+        challenge_id = str(challenge.get("id", ""))
+        source = challenge.get("compute")
+        with self._lock:
+            entry = self._entries.get(challenge_id)
+            if entry is not None and entry[0].source == source:
+                self._entries.move_to_end(challenge_id)
+                return entry[0]
+        compiled = compiled or compile_expression(source)
+        with self._lock:
+            self._entries[challenge_id] = (compiled, challenge)
+            self._entries.move_to_end(challenge_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def get(self, challenge_id: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(challenge_id)
+            if entry is not None:
+                self._entries.move_to_end(challenge_id)
+            return entry
+
+challenge_registry = _ChallengeRegistry()
@@ -1,20 +1,64 @@
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import threading
+import time
+import numpy as np
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from config import FRONTEND_URL, PORT
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from config import FRONTEND_URL, PORT, EXPR_MAX_INPUT_POINTS
 from models import (
     HintRequest, HintResponse,
-    ReportRequest, ReportResponse,
-    ChallengeRequest, ChallengeResponse,
+    ReportRequest, ReportResponse, BatchReportRequest,
+    ChallengeRequest, ChallengeResponse, ChallengeEvaluateRequest,
     ExperimentRecord, StudentProgress,
 )
-from agent import generate_hint, generate_report_result, generate_challenge, generate_viva_questions
-from db import save_experiment, get_student_stats
+from agent import (
+    generate_hint_async, generate_report_async, generate_challenge_async,
+    generate_viva_questions_async, generate_reports_batch_async,
+    stream_hint_async, stream_report_async,
+)
+from db import save_experiment, get_student_stats, flush_experiments
+from telemetry import telemetry, DEFAULT_COHORT
+from events import cohort_bus
+from physics import check_observations, challenge_hits
+from expr import challenge_registry, ExpressionError
+from bank import challenge_bank
+import metrics
+import catalog
+
+_warm = threading.Event()
+
+def _warm_up():
+    # Imports the Gemini and Supabase SDKs and builds their clients off the
+    # request path, so the first student after a cold start doesn't wait on it.
+    from agent import get_model
+    from db import get_storage
+    try:
+        get_model()
+        get_storage()
+    finally:
+        _warm.set()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Not awaited: the app takes traffic while this runs.
+    warmup = asyncio.create_task(asyncio.to_thread(_warm_up))
+    dashboard_ticker = asyncio.create_task(cohort_bus.run())
+    bank_refill = asyncio.create_task(challenge_bank.run(generate_challenge_async, generate_viva_questions_async))
+    yield
+    dashboard_ticker.cancel()
+    bank_refill.cancel()
+    await asyncio.to_thread(flush_experiments)
 
 app = FastAPI(
     title="VirtuLab API",
     description="AI-powered virtual lab backend with Socratic tutoring",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -25,36 +69,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.http_latency.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=metrics.route_label(request.scope) or "unmatched",
+            status=status,
+        )
+
+@app.get("/api/metrics")
+def get_metrics():
+    
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/health")
 def health():
     
-    from agent import get_model
-    from db import get_client
+    from agent import get_model, singleflight_stats, structured_output_stats
+    from breaker import gemini_breaker
+    from cache import hint_cache
+    from db import get_storage
+    # Until the startup warmup finishes, asking would block on it.
+    warm = _warm.is_set()
     return {
         "status": "ok",
-        "gemini": "connected" if get_model() else "offline",
-        "database": "connected" if get_client() else "offline (in-memory)",
+        "gemini": ("connected" if get_model() else "offline") if warm else "warming",
+        "gemini_circuit": gemini_breaker.snapshot(),
+        "database": get_storage().name if warm else "warming",
+        "hint_cache": hint_cache.stats(),
+        "llm_singleflight": singleflight_stats(),
+        "structured_output": structured_output_stats(),
+        "dashboard_subscribers": cohort_bus.subscriber_count(),
     }
 
 @app.get("/api/simulations")
-def get_simulations():
+def get_simulations(request: Request):
     
-    return [
-        {"name": "Ohm’s Law & Resistance", "subject": "Physics", "color": "bg-blue-500", "shadow": "shadow-blue-500/20", "icon": "/icon_ohm_law.png", "labKey": "ohm-law"},
-        {"name": "Projectile Motion", "subject": "Physics", "color": "bg-indigo-500", "shadow": "shadow-indigo-500/20", "icon": "/icon_projectile.png", "labKey": "projectile-motion"},
-        {"name": "Optics Bench", "subject": "Physics", "color": "bg-cyan-500", "shadow": "shadow-cyan-500/20", "icon": "/icon_optics.png", "labKey": "optics-bench"},
-        {"name": "Logic Gates", "subject": "Physics", "color": "bg-blue-600", "shadow": "shadow-blue-600/20", "icon": "/icon_logic_gates.png", "labKey": "logic-gates"},
-        {"name": "Acid-Base Titration", "subject": "Chemistry", "color": "bg-orange-500", "shadow": "shadow-orange-500/20", "icon": "/icon_titration.png", "labKey": "titration"},
-        {"name": "Flame Test", "subject": "Chemistry", "color": "bg-rose-500", "shadow": "shadow-rose-500/20", "icon": "/icon_flame_test.png", "labKey": "flame-test"},
-        {"name": "Periodic Table Trends", "subject": "Chemistry", "color": "bg-amber-500", "shadow": "shadow-amber-500/20", "icon": "/icon_periodic_table.png", "labKey": "periodic-table"},
-        {"name": "Rate of Reaction", "subject": "Chemistry", "color": "bg-orange-600", "shadow": "shadow-orange-600/20", "icon": "/icon_reaction_rate.png", "labKey": "reaction-rate"},
-        {"name": "Mitosis", "subject": "Biology", "color": "bg-green-600", "shadow": "shadow-green-600/20", "icon": "/icon_mitosis.png", "labKey": "mitosis"},
-    ]
+    return catalog.simulations.respond(request)
+
+@app.get("/api/templates")
+def get_templates(request: Request):
+    
+    # The offline hint, report and viva tables, for clients to cache.
+    return catalog.templates.respond(request)
 
 @app.post("/api/ai/hint", response_model=HintResponse)
-def get_hint(req: HintRequest):
+async def get_hint(req: HintRequest):
     
-    result = generate_hint(
+    if req.trigger == "failure" and req.failure_name:
+        cohort_bus.publish_hint_failure(req.cohort, req.simulation, req.failure_name)
+    result = await generate_hint_async(
         simulation=req.simulation,
         trigger=req.trigger,
         failure_name=req.failure_name,
@@ -67,42 +139,117 @@ def get_hint(req: HintRequest):
         level=result.get("level", 1),
         follow_up=result.get("follow_up"),
     )
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/api/ai/hint/stream")
+async def stream_hint(req: HintRequest):
+    
+    if req.trigger == "failure" and req.failure_name:
+        cohort_bus.publish_hint_failure(req.cohort, req.simulation, req.failure_name)
+
+    async def events():
+        async for chunk in stream_hint_async(
+            simulation=req.simulation,
+            trigger=req.trigger,
+            failure_name=req.failure_name,
+            context=req.context,
+            student_message=req.student_message,
+        ):
+            yield _sse("token", {"text": chunk})
+        yield _sse("done", {"trigger": req.trigger, "level": 1})
+
+    return _sse_response(events())
 @app.post("/api/ai/report")
-def get_report(req: ReportRequest):
+async def get_report(req: ReportRequest):
     
-    result_text = generate_report_result(
+    report = await generate_report_async(
         simulation=req.simulation,
         observations=req.observations,
         failures=[f.dict() if hasattr(f, 'dict') else f for f in req.failures],
         duration=req.duration,
         score=req.score,
     )
+    report["observation_check"] = check_observations(req.simulation, req.observations)
+    return report
+@app.post("/api/ai/report/batch")
+async def get_reports_batch(req: BatchReportRequest):
+    
+    reports = [
+        {
+            "simulation": r.simulation,
+            "observations": r.observations,
+            "failures": r.failures,
+            "duration": r.duration,
+            "score": r.score,
+        }
+        for r in req.reports
+    ]
+    generated = await generate_reports_batch_async(reports)
+    for r, report in zip(req.reports, generated):
+        report["student_id"] = r.student_id
+        report["observation_check"] = check_observations(r.simulation, r.observations)
+    return {"reports": generated}
+@app.post("/api/ai/report/stream")
+async def stream_report(req: ReportRequest):
+    
+    async def events():
+        async for event, data in stream_report_async(
+            simulation=req.simulation,
+            observations=req.observations,
+            failures=[f.dict() if hasattr(f, 'dict') else f for f in req.failures],
+            duration=req.duration,
+            score=req.score,
+        ):
+            yield _sse(event, {"text": data} if event == "result" else data)
+        yield _sse("observation_check", check_observations(req.simulation, req.observations))
+        yield _sse("done", {})
 
-    viva = generate_viva_questions(req.simulation, req.observations)
-
-    return {
-        "result": result_text,
-        "viva_questions": viva,
-    }
+    return _sse_response(events())
 @app.post("/api/ai/challenge")
-def get_challenge(req: ChallengeRequest):
+async def get_challenge(req: ChallengeRequest):
     
-    challenge = generate_challenge(
-        simulation=req.simulation,
-        completed=req.completed_challenges,
-        skill_level=req.skill_level,
-    )
+    challenge = challenge_bank.take_challenge(req.simulation, req.skill_level, req.completed_challenges)
     if challenge:
         return challenge
     return {"fallback": True, "message": "Use offline challenges"}
 
+@app.post("/api/ai/challenge/{challenge_id}/evaluate")
+async def evaluate_challenge(challenge_id: str, req: ChallengeEvaluateRequest):
+    entry = challenge_registry.get(challenge_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired challenge")
+    compiled, challenge = entry
+    try:
+        # Client input, so the amount of NumPy work done on the event loop is capped.
+        value = compiled.evaluate(req.inputs, EXPR_MAX_INPUT_POINTS)
+    except (ExpressionError, TypeError, ValueError, OverflowError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    hits = challenge_hits(challenge, value)
+    if isinstance(value, float):
+        return {"value": value if np.isfinite(value) else None, "within_tolerance": bool(hits)}
+    finite = np.isfinite(value)
+    return {
+        "value": [v if ok else None for v, ok in zip(value.tolist(), finite.tolist())],
+        "within_tolerance": hits.tolist(),
+    }
+
 @app.post("/api/progress/save")
 def save_progress(record: ExperimentRecord):
     
-    data = record.dict()
+    data = record.dict(exclude={"cohort"})
     success = save_experiment(data)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to save progress")
+    telemetry.record(record.cohort, record.simulation, record.failures)
+    cohort_bus.publish_experiment(record.cohort, data)
     return {"status": "saved", "student_id": record.student_id}
 @app.get("/api/progress/{student_id}")
 def get_progress(student_id: str):
@@ -110,6 +257,32 @@ def get_progress(student_id: str):
     stats = get_student_stats(student_id)
     return stats
 
+@app.get("/api/telemetry/misconceptions")
+def get_misconceptions(cohort: Optional[str] = None, simulation: Optional[str] = None,
+                       minutes: float = 15, limit: int = 5):
+    
+    return telemetry.top_failures(cohort=cohort, simulation=simulation, minutes=minutes, limit=limit)
+
+@app.get("/api/teacher/live")
+async def teacher_live(cohort: str = DEFAULT_COHORT):
+    
+    queue = cohort_bus.subscribe(cohort)
+
+    async def events():
+        try:
+            yield _sse("subscribed", {"cohort": cohort, "tick": cohort_bus.tick})
+            while True:
+                try:
+                    batch = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse("batch", batch)
+        finally:
+            cohort_bus.unsubscribe(cohort, queue)
+
+    return _sse_response(events())
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=PORT, reload=True)
@@ -0,0 +1,164 @@
+import functools
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+# Latency buckets in seconds, spanning cache hits through slow LLM calls.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, values):
+                cumulative += n
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {values[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {values[-1]}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series: dict = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for key, value in sorted(series.items()):
+            lines.append(f"{self.name}{_labels(self.labels, key)} {value}")
+        return lines
+
+http_latency = Histogram(
+    "virtulab_http_request_duration_seconds",
+    "Time to response headers per route (time to first byte for streams).",
+    ("method", "route", "status"),
+)
+llm_latency = Histogram(
+    "virtulab_llm_call_duration_seconds",
+    "Upstream Gemini call latency (time to first token for streams).",
+    ("mode", "simulation", "trigger", "outcome"),
+)
+llm_tokens = Counter(
+    "virtulab_llm_tokens_total",
+    "Gemini prompt and response tokens, from the API's usage metadata.",
+    ("simulation", "trigger", "direction"),
+)
+llm_queue_timeouts = Counter(
+    "virtulab_llm_queue_timeouts_total",
+    "Gemini calls abandoned while waiting for a local concurrency slot.",
+    ("simulation", "trigger"),
+)
+db_latency = Histogram(
+    "virtulab_db_operation_duration_seconds",
+    "Experiment storage operation latency.",
+    ("operation", "outcome"),
+)
+REGISTRY = (http_latency, llm_latency, llm_tokens, llm_queue_timeouts, db_latency)
+
+@functools.lru_cache(maxsize=None)
+def _lab_keys() -> frozenset:
+    # Imported late: catalog pulls in agent, which imports this module.
+    from catalog import SIMULATIONS
+    return frozenset(s["labKey"] for s in SIMULATIONS)
+
+def simulation_label(simulation) -> str:
+    # Simulation names come from request bodies. Anything outside the catalog
+    # shares one "other" series, so a client can't mint new series at will.
+    if not simulation:
+        return ""
+    return simulation if isinstance(simulation, str) and simulation in _lab_keys() else "other"
+
+# What the current request is asking the LLM for. Set once by the agent entry
+# point and inherited by any task it spawns, including single-flight leaders.
+_llm_tags: ContextVar[tuple] = ContextVar("llm_tags", default=("", ""))
+
+def tag_llm(simulation: str, trigger: str):
+    _llm_tags.set((simulation_label(simulation), trigger or ""))
+
+def record_llm_call(mode: str, seconds: float, outcome: str, response=None):
+    simulation, trigger = _llm_tags.get()
+    llm_latency.observe(seconds, mode=mode, simulation=simulation, trigger=trigger, outcome=outcome)
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        prompt = getattr(usage, "prompt_token_count", 0) or 0
+        completion = getattr(usage, "candidates_token_count", 0) or 0
+        llm_tokens.inc(prompt, simulation=simulation, trigger=trigger, direction="prompt")
+        llm_tokens.inc(completion, simulation=simulation, trigger=trigger, direction="response")
+
+def record_llm_queue_timeout():
+    simulation, trigger = _llm_tags.get()
+    llm_queue_timeouts.inc(simulation=simulation, trigger=trigger)
+
+def db_span(operation: str):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                db_latency.observe(time.perf_counter() - started, operation=operation, outcome=outcome)
+        return wrapper
+    return decorate
+
+def route_label(scope: dict) -> Optional[str]:
+    # The route template, so /api/student/{student_id} is one series rather
+    # than one per student.
+    route = scope.get("route")
+    return getattr(route, "path", None)
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,13 +1,16 @@
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Dict, List, Any
 from datetime import datetime
+from config import REPORT_BATCH_MAX
 class HintRequest(BaseModel):
     simulation: str  # e.g. "ohm-law"
     trigger: str  # "failure" | "danger_zone" | "ask_ai"
     failure_name: Optional[str] = None  # e.g. "OVERLOAD"
     context: Dict[str, Any] = {}  # current param values like {"voltage": 24, "resistance": 10}
     student_message: Optional[str] = None  # student's question (for ask_ai trigger)
+    student_id: Optional[str] = None
+    cohort: Optional[str] = None  # class/section tag, routes failure events to the teacher dashboard
 class HintResponse(BaseModel):
     message: str
     trigger: str
@@ -19,6 +22,9 @@ class ReportRequest(BaseModel):
     failures: List[Dict[str, str]]
     duration: int
     score: int
+    student_id: Optional[str] = None
+class BatchReportRequest(BaseModel):
+    reports: List[ReportRequest] = Field(..., max_length=REPORT_BATCH_MAX)  # one class at a time
 class ReportResponse(BaseModel):
     aim: str
     result: str
@@ -40,6 +46,9 @@ class ChallengeResponse(BaseModel):
     proof: str
     fixed_params: Dict[str, float] = {}
     compute: str
+class ChallengeEvaluateRequest(BaseModel):
+    # Each input may be a single slider value or a list to evaluate in bulk.
+    inputs: Dict[str, Any] = {}
 class ExperimentRecord(BaseModel):
     student_id: str
     simulation: str
@@ -51,6 +60,7 @@ class ExperimentRecord(BaseModel):
     challenge_completed: Optional[str] = None
     prediction_accuracy: Optional[float] = None
     timestamp: Optional[str] = None
+    cohort: Optional[str] = None  # class/section tag for teacher telemetry; not persisted
 class StudentProgress(BaseModel):
     student_id: str
     total_experiments: int
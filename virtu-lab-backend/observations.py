@@ -0,0 +1,161 @@
+import numpy as np
+from typing import Dict, List
+from config import OBSERVATION_STORE_POINTS, OBSERVATION_PROMPT_POINTS
+from physics import ENGINES, check_observations
+
+# Observations arrive as one dict per recorded row. Stored and prompted as is,
+# a long session bloats rows, payloads and prompts with near-identical points.
+# The compact form is columnar, with the row index kept so a reduced series
+# still says where each point came from:
+#   {"n": total rows, "index": [...], "columns": {"voltage": [...], ...}}
+
+# (input, output) whose steepest change marks the point of the experiment,
+# e.g. the equivalence point of a titration.
+TURNING_POINTS = {
+    "titration": ("baseVolume", "ph"),
+    "optics-bench": ("objectDistance", "imageDistance"),
+}
+
+def is_compact(observations) -> bool:
+    return isinstance(observations, dict) and "columns" in observations
+
+def _float(value) -> float:
+    # An int too large for a double is as unusable as a missing value.
+    try:
+        return float(value)
+    except OverflowError:
+        return np.nan
+
+def to_columns(observations: list) -> dict:
+    # Numeric keys become float columns (NaN where a row lacks them); other
+    # values are dropped, they carry nothing a chart or a prompt can use.
+    rows = [o for o in observations or [] if isinstance(o, dict)]
+    keys = []
+    for row in rows:
+        for k, v in row.items():
+            if k not in keys and isinstance(v, (int, float)) and not isinstance(v, bool):
+                keys.append(k)
+    columns = {
+        k: np.array([_float(row.get(k)) if isinstance(row.get(k), (int, float)) else np.nan for row in rows], dtype=float)
+        for k in keys
+    }
+    return {"n": len(rows), "index": np.arange(len(rows)), "columns": columns}
+
+def _lttb(y: np.ndarray, threshold: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets over (row index, y): keeps the points
+    # that carry the visible shape of the series.
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    y = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+    picked = [0]
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = (next_lo + next_hi - 1) / 2
+        avg_y = y[next_lo:next_hi].mean() if next_hi > next_lo else y[-1]
+        xs = np.arange(lo, hi)
+        area = np.abs((a - avg_x) * (y[lo:hi] - y[a]) - (a - xs) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area)) if hi > lo else a
+        picked.append(a)
+    picked.append(n - 1)
+    return np.unique(picked)
+
+def downsample(compact: dict, max_points: int) -> dict:
+    # Every column gets an equal share of the budget; the union of the rows
+    # each one keeps is stored, so no variable loses its peaks.
+    n = len(compact["index"])
+    if n <= max_points:
+        return compact
+    columns = compact["columns"]
+    share = max(3, max_points // max(1, len(columns)))
+    keep = np.unique(np.concatenate([_lttb(col, share) for col in columns.values()] or [np.array([0, n - 1])]))
+    if len(keep) > max_points:
+        keep = keep[np.linspace(0, len(keep) - 1, max_points).astype(int)]
+    return {
+        "n": compact["n"],
+        "index": compact["index"][keep],
+        "columns": {k: v[keep] for k, v in columns.items()},
+    }
+
+def _jsonable(compact: dict) -> dict:
+    # JSON has no inf or NaN, and a stored row must always read back.
+    return {
+        "n": int(compact["n"]),
+        "index": [int(i) for i in compact["index"]],
+        "columns": {k: [round(float(x), 6) if np.isfinite(x) else None for x in v] for k, v in compact["columns"].items()},
+    }
+
+def compact(observations, max_points: int = OBSERVATION_STORE_POINTS) -> dict:
+    # The storage form. Already-compact input passes through.
+    if is_compact(observations):
+        return observations
+    return _jsonable(downsample(to_columns(observations), max_points))
+
+def expand(observations) -> List[dict]:
+    # Back to rows, for readers that want them; accepts either form.
+    if not is_compact(observations):
+        return list(observations or [])
+    columns = observations["columns"]
+    rows = []
+    for i, idx in enumerate(observations["index"]):
+        row = {k: v[i] for k, v in columns.items() if v[i] is not None}
+        row["row"] = idx
+        rows.append(row)
+    return rows
+
+def informative_points(simulation: str, observations, limit: int = OBSERVATION_PROMPT_POINTS) -> List[dict]:
+    # The handful of rows worth showing a report writer: first and last,
+    # the turning point, each variable's extremes and rows whose recorded
+    # values disagree with the physics, in that order of priority. Each point
+    # says why it was picked.
+    rows = expand(observations)
+    if not rows:
+        return []
+    # Positions below are into `rows`; "row" maps back to the recorded row.
+    index = [r.get("row", i) for i, r in enumerate(rows)]
+    columns = {k: v for k, v in to_columns(rows)["columns"].items() if k != "row"}
+    reasons: Dict[int, List[str]] = {}
+
+    def pick(i: int, why: str):
+        reasons.setdefault(int(i), []).append(why)
+
+    pick(0, "first")
+    pick(len(rows) - 1, "last")
+    turning = TURNING_POINTS.get(simulation)
+    if turning and all(k in columns for k in turning) and len(rows) > 2:
+        x, y = columns[turning[0]], columns[turning[1]]
+        order = np.argsort(x, kind="stable")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = np.abs(np.diff(y[order]) / np.diff(x[order]))
+        slope = np.where(np.isfinite(slope), slope, -1)
+        if slope.size and slope.max() > 0:
+            pick(order[int(np.argmax(slope)) + 1], f"steepest {turning[1]} change")
+    for k, col in columns.items():
+        if np.isfinite(col).sum() > 1 and np.nanmax(col) != np.nanmin(col):
+            pick(int(np.nanargmax(col)), f"max {k}")
+            pick(int(np.nanargmin(col)), f"min {k}")
+    if simulation in ENGINES:
+        # Worst disagreement first; an out-of-range input always leads.
+        def off_by(issue):
+            if isinstance(issue["expected"], list):
+                return np.inf
+            return abs(issue["observed"] - issue["expected"]) / max(abs(issue["expected"]), 1e-9)
+        for issue in sorted(check_observations(simulation, rows)["issues"], key=off_by, reverse=True):
+            pick(issue["index"], f"{issue['key']} inconsistent (expected {issue['expected']})")
+
+    chosen = sorted(list(reasons)[:limit])
+    points = []
+    for i in chosen:
+        point = {k: (round(v, 4) if isinstance(v, float) else v) for k, v in rows[i].items() if k != "row"}
+        point["row"] = int(index[i])
+        point["why"] = ", ".join(reasons[i])
+        points.append(point)
+    return points
+
+def prompt_summary(simulation: str, observations, limit: int = OBSERVATION_PROMPT_POINTS) -> dict:
+    # What goes into a report or viva prompt instead of the first few rows.
+    total = observations.get("n", 0) if is_compact(observations) else len(observations or [])
+    return {"rows_recorded": total, "key_points": informative_points(simulation, observations, limit)}
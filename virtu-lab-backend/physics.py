@@ -0,0 +1,220 @@
+import numpy as np
+from typing import Callable, Dict, Optional
+from config import PHYSICS_GRID_POINTS, OBSERVATION_TOLERANCE
+
+G = 9.81
+
+# Slider ranges (min, max, step) and defaults, mirroring the frontend controls.
+PARAM_RANGES = {
+    "ohm-law": {"voltage": (0, 24, 0.5), "resistance": (1, 1000, 1)},
+    "projectile-motion": {"angle": (0, 90, 1), "velocity": (0, 50, 1)},
+    "titration": {"baseVolume": (0, 50, 0.1)},
+    "optics-bench": {"focalLength": (5, 50, 1), "objectDistance": (5, 100, 1)},
+    "reaction-rate": {"temperature": (0, 100, 1), "concentration": (0.1, 5, 0.1)},
+}
+
+DEFAULTS = {
+    "voltage": 5, "resistance": 100, "angle": 45, "velocity": 20, "baseVolume": 0,
+    "focalLength": 15, "objectDistance": 30, "temperature": 25, "concentration": 1,
+}
+
+# Scale factors from each output's native unit (as shown in the lab UI).
+UNITS = {
+    "current": {"mA": 1, "A": 1e-3},
+    "power": {"W": 1, "mW": 1e3},
+    "range": {"m": 1, "cm": 100},
+    "maxHeight": {"m": 1, "cm": 100},
+    "timeOfFlight": {"s": 1},
+    "ph": {"": 1, "pH": 1},
+    "imageDistance": {"cm": 1, "m": 0.01, "mm": 10},
+    "magnification": {"": 1, "x": 1},
+    "rate": {"": 1},
+}
+
+def _number(value, default):
+    # Overflowing or non-finite readings count as not recorded; an inf would
+    # also end up in the JSON response.
+    try:
+        number = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return default
+    return number if np.isfinite(number) else default
+
+def _ohm_law(p):
+    v, r = p["voltage"], p["resistance"]
+    return {"current": v / r * 1000, "power": v * v / r}
+
+def _projectile(p):
+    a = np.radians(p["angle"])
+    vel = p["velocity"]
+    return {
+        "range": vel ** 2 * np.sin(2 * a) / G,
+        "maxHeight": vel ** 2 * np.sin(a) ** 2 / (2 * G),
+        "timeOfFlight": 2 * vel * np.sin(a) / G,
+    }
+
+def _titration(p):
+    # 25 mL of 0.1 M HCl titrated with 0.1 M NaOH; equivalence at 25 mL.
+    vol = p["baseVolume"]
+    nv = 25
+    h = 0.1 * (nv - vol) / (25 + vol)
+    oh = -h
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ph = np.where(h > 0, -np.log10(np.where(h > 0, h, 1)),
+                      np.where(oh > 0, 14 + np.log10(np.where(oh > 0, oh, 1)), 7.0))
+    return {"ph": ph}
+
+def _optics(p):
+    f, u = p["focalLength"], p["objectDistance"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        v = u * f / (u - f)
+        return {"imageDistance": v, "magnification": np.abs(v / u)}
+
+def _reaction_rate(p):
+    return {"rate": p["concentration"] * np.exp((p["temperature"] - 25) / 10) * 2}
+
+ENGINES = {
+    "ohm-law": _ohm_law,
+    "projectile-motion": _projectile,
+    "titration": _titration,
+    "optics-bench": _optics,
+    "reaction-rate": _reaction_rate,
+}
+
+def evaluate(simulation: str, params: Dict[str, object]) -> Dict[str, np.ndarray]:
+    # Evaluates every output of a simulation for scalar or array inputs;
+    # missing inputs take the lab's default slider value.
+    engine = ENGINES[simulation]
+    full = {k: np.asarray(params.get(k, DEFAULTS[k]), dtype=float) for k in PARAM_RANGES[simulation]}
+    return engine(full)
+
+def _axis(lo: float, hi: float, step: float, max_points: int) -> np.ndarray:
+    n = int(round((hi - lo) / step)) + 1
+    if n <= max_points:
+        return lo + step * np.arange(n)
+    return np.linspace(lo, hi, max_points)
+
+def _free_axes(simulation: str, fixed: Dict[str, float], max_points: int) -> Dict[str, np.ndarray]:
+    return {k: _axis(*rng, max_points) for k, rng in PARAM_RANGES[simulation].items() if k not in fixed}
+
+def grid(simulation: str, fixed_params: Optional[Dict[str, float]] = None,
+         max_points: int = PHYSICS_GRID_POINTS) -> Dict[str, np.ndarray]:
+    # Flattened cartesian grid over the free sliders, with fixed params held.
+    fixed = fixed_params or {}
+    free = _free_axes(simulation, fixed, max_points)
+    mesh = np.meshgrid(*free.values(), indexing="ij") if free else []
+    params = {k: m.ravel() for k, m in zip(free, mesh)}
+    size = mesh[0].size if free else 1
+    for k, v in fixed.items():
+        if k in PARAM_RANGES[simulation]:
+            params[k] = np.full(size, float(v))
+    return params
+
+def _target(key: str):
+    # "power_under" / "rate_over" style keys bound the output instead of pinning it.
+    for suffix in ("_under", "_over"):
+        if key.endswith(suffix):
+            return key[: -len(suffix)], suffix[1:]
+    return key, "equal"
+
+def within_target(values: np.ndarray, target: float, tolerance_pct: float, mode: str = "equal") -> np.ndarray:
+    band = abs(target) * tolerance_pct / 100
+    with np.errstate(invalid="ignore"):
+        if mode == "under":
+            return values <= target + band
+        if mode == "over":
+            return values >= target - band
+        return np.abs(values - target) <= band
+
+def challenge_hits(challenge: dict, values) -> np.ndarray:
+    # Which of the given output values satisfy the challenge's target.
+    key, mode = _target(challenge.get("target_key", ""))
+    target = _number(challenge.get("target_value"), np.nan)
+    with np.errstate(invalid="ignore"):
+        return within_target(values, target, _number(challenge.get("tolerance"), 5), mode) & np.isfinite(values)
+
+def check_challenge(simulation: str, challenge: dict, compute: Optional[Callable] = None) -> dict:
+    # Sweeps the free sliders in one vectorized pass and reports whether any
+    # reachable setting lands inside the challenge's tolerance band. When the
+    # challenge's compiled `compute` expression is given it is swept instead of
+    # the engine, since that is what the student's answer is scored against.
+    key, mode = _target(challenge.get("target_key", ""))
+    if simulation not in ENGINES:
+        return {"checked": False, "reason": f"no engine for {simulation}"}
+    fixed = challenge.get("fixed_params")
+    fixed = {k: _number(v, DEFAULTS.get(k, 0)) for k, v in fixed.items()} if isinstance(fixed, dict) else {}
+    target = _number(challenge.get("target_value"), None)
+    if target is None:
+        return {"checked": False, "reason": "non-numeric target_value"}
+    params = grid(simulation, fixed)
+    full = {k: params.get(k, np.full(1, float(DEFAULTS[k]))) for k in PARAM_RANGES[simulation]}
+    values = None
+    if compute is not None:
+        try:
+            values = np.asarray(compute(full), dtype=float)
+        except (ValueError, TypeError, ArithmeticError):
+            values = None
+    if values is None:
+        outputs = ENGINES[simulation](full)
+        if key not in outputs:
+            return {"checked": False, "reason": f"unknown target {key} for {simulation}"}
+        values = outputs[key] * UNITS.get(key, {}).get(challenge.get("target_unit", ""), 1)
+    values = np.broadcast_to(values, next(iter(params.values())).shape)
+    hits = challenge_hits(challenge, values)
+    # Students can also type exact values, so a target that falls between two
+    # neighbouring grid points counts as reachable too. Pairs whose values
+    # change sign straddle a pole (e.g. u = f on the optics bench) and are skipped.
+    shape = tuple(len(a) for a in _free_axes(simulation, fixed, PHYSICS_GRID_POINTS).values())
+    crossed = np.zeros(shape or (1,), dtype=bool)
+    if mode == "equal" and shape:
+        cube = values.reshape(shape)
+        for axis in range(len(shape)):
+            a = np.moveaxis(cube, axis, 0)
+            lo, hi = a[:-1], a[1:]
+            with np.errstate(invalid="ignore"):
+                straddle = ((lo - target) * (hi - target) < 0) & (lo * hi > 0) & np.isfinite(lo) & np.isfinite(hi)
+            moved = np.moveaxis(crossed, axis, 0)
+            moved[:-1] |= straddle
+    hits = hits | crossed.ravel()
+    finite = np.where(np.isfinite(values), values, np.inf)
+    best = int(np.argmin(np.abs(finite - target)))
+    return {
+        "checked": True,
+        "solvable": bool(hits.any()),
+        "solutions": int(hits.sum()),
+        "grid_size": int(values.size),
+        "closest": float(values[best]),
+        "closest_inputs": {k: float(v[best]) for k, v in params.items()},
+    }
+
+def check_observations(simulation: str, observations: list,
+                       tolerance_pct: float = OBSERVATION_TOLERANCE) -> dict:
+    # Recomputes every derived value the student recorded from the inputs on
+    # the same row, all rows at once, and flags rows that disagree or sit
+    # outside the lab's slider ranges.
+    if simulation not in ENGINES or not observations:
+        return {"checked": 0, "consistent": True, "issues": []}
+
+    ranges = PARAM_RANGES[simulation]
+    params = {
+        k: np.array([_number(o.get(k), DEFAULTS[k]) for o in observations], dtype=float)
+        for k in ranges
+    }
+    expected = ENGINES[simulation](params)
+    issues = []
+    for k, (lo, hi, _) in ranges.items():
+        for i in np.flatnonzero((params[k] < lo) | (params[k] > hi)):
+            issues.append({"index": int(i), "key": k, "observed": float(params[k][i]), "expected": [lo, hi]})
+    for key, values in expected.items():
+        observed = np.array([_number(o.get(key), np.nan) for o in observations], dtype=float)
+        recorded = ~np.isnan(observed)
+        if not recorded.any():
+            continue
+        values = np.broadcast_to(values, observed.shape)
+        # A small absolute slack absorbs the rounding the UI applies to displayed values.
+        with np.errstate(invalid="ignore"):
+            bad = recorded & ~(within_target(observed, values, tolerance_pct) | (np.abs(observed - values) <= 0.05))
+        for i in np.flatnonzero(bad):
+            issues.append({"index": int(i), "key": key, "observed": float(observed[i]), "expected": round(float(values[i]), 3)})
+
+    return {"checked": len(observations), "consistent": not issues, "issues": issues}
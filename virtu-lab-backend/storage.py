@@ -0,0 +1,241 @@
+import bisect
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+# Columns of an experiment row, matching ExperimentRecord.
+FIELDS = (
+    "timestamp", "student_id", "simulation", "score", "duration", "mistakes",
+    "failures", "observations", "challenge_completed", "prediction_accuracy",
+)
+
+class ExperimentStorage(ABC):
+    # Backend interface used by db.py. Reads return row dicts newest first;
+    # history() only needs the columns the per-student aggregates fold in,
+    # plus timestamp so rows still queued in db.py aren't counted twice.
+    name = "unknown"
+    durable = True
+
+    @abstractmethod
+    def insert_many(self, rows: list):
+        ...
+
+    @abstractmethod
+    def recent(self, student_id: str, limit: int = 50) -> list:
+        ...
+
+    @abstractmethod
+    def recent_for_simulation(self, simulation: str, limit: int = 50) -> list:
+        ...
+
+    @abstractmethod
+    def history(self, student_id: str) -> list:
+        ...
+
+def _timestamp(rec: tuple) -> str:
+    return rec[0]
+
+class MemoryStorage(ExperimentStorage):
+    # Offline experiment store. Records are kept as tuples in FIELDS order
+    # (plus a dict of any extra keys) and indexed by student and simulation.
+    # Every index list is sorted oldest-first, so newest-N is a slice.
+    name = "offline (in-memory)"
+    durable = False
+
+    def __init__(self, max_records: int, max_per_student: int):
+        self.max_records = max_records
+        self.max_per_student = max_per_student
+        self._all: list = []
+        self._by_student: dict = {}
+        self._by_simulation: dict = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _pack(record: dict) -> tuple:
+        extra = {k: v for k, v in record.items() if k not in FIELDS}
+        return tuple(record.get(f) for f in FIELDS) + (extra or None,)
+
+    @staticmethod
+    def _unpack(rec: tuple) -> dict:
+        record = dict(zip(FIELDS, rec))
+        if rec[-1]:
+            record.update(rec[-1])
+        return record
+
+    @staticmethod
+    def _insert(lst: list, rec: tuple):
+        if not lst or lst[-1][0] <= rec[0]:
+            lst.append(rec)
+        else:
+            bisect.insort(lst, rec, key=_timestamp)
+
+    @staticmethod
+    def _remove(lst: list, rec: tuple):
+        i = bisect.bisect_left(lst, rec[0], key=_timestamp)
+        while lst[i] is not rec:
+            i += 1
+        del lst[i]
+
+    def _evict(self, rec: tuple):
+        self._remove(self._all, rec)
+        for index, key in ((self._by_student, rec[1]), (self._by_simulation, rec[2])):
+            lst = index[key]
+            self._remove(lst, rec)
+            if not lst:
+                del index[key]
+
+    def add(self, record: dict):
+        rec = self._pack(record)
+        with self._lock:
+            self._insert(self._all, rec)
+            student = self._by_student.setdefault(rec[1], [])
+            self._insert(student, rec)
+            self._insert(self._by_simulation.setdefault(rec[2], []), rec)
+            if len(student) > self.max_per_student:
+                self._evict(student[0])
+            while len(self._all) > self.max_records:
+                self._evict(self._all[0])
+
+    def insert_many(self, rows: list):
+        for row in rows:
+            self.add(row)
+
+    def _newest(self, index: dict, key: str, limit: int = None) -> list:
+        with self._lock:
+            records = index.get(key, [])
+            records = records[-limit:] if limit else records[:]
+        return [self._unpack(r) for r in reversed(records)]
+
+    def recent(self, student_id: str, limit: int = 50) -> list:
+        return self._newest(self._by_student, student_id, limit)
+
+    def recent_for_simulation(self, simulation: str, limit: int = 50) -> list:
+        return self._newest(self._by_simulation, simulation, limit)
+
+    def history(self, student_id: str) -> list:
+        return self._newest(self._by_student, student_id)
+
+    def __len__(self) -> int:
+        return len(self._all)
+
+class SupabaseStorage(ExperimentStorage):
+    name = "connected"
+    page_size = 1000
+
+    def __init__(self, client):
+        self.client = client
+
+    def insert_many(self, rows: list):
+        self.client.table("experiments").insert(rows).execute()
+
+    def _recent_by(self, column: str, value: str, limit: int) -> list:
+        result = self.client.table("experiments") \
+            .select("*") \
+            .eq(column, value) \
+            .order("timestamp", desc=True) \
+            .limit(limit) \
+            .execute()
+        return result.data or []
+
+    def recent(self, student_id: str, limit: int = 50) -> list:
+        return self._recent_by("student_id", student_id, limit)
+
+    def recent_for_simulation(self, simulation: str, limit: int = 50) -> list:
+        return self._recent_by("simulation", simulation, limit)
+
+    def history(self, student_id: str) -> list:
+        rows = []
+        while True:
+            result = self.client.table("experiments") \
+                .select("timestamp,simulation,score,duration") \
+                .eq("student_id", student_id) \
+                .range(len(rows), len(rows) + self.page_size - 1) \
+                .execute()
+            rows.extend(result.data or [])
+            if len(result.data or []) < self.page_size:
+                return rows
+
+_JSON_FIELDS = ("failures", "observations")
+
+class SQLiteStorage(ExperimentStorage):
+    # Durable local store. WAL mode lets readers run alongside the
+    # write-behind flusher; each thread keeps and reuses its own connection.
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = f"sqlite ({path})"
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS experiments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                student_id TEXT NOT NULL,
+                simulation TEXT NOT NULL,
+                score INTEGER,
+                duration INTEGER,
+                mistakes INTEGER,
+                failures TEXT,
+                observations TEXT,
+                challenge_completed TEXT,
+                prediction_accuracy REAL,
+                extra TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_experiments_student_ts ON experiments (student_id, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_experiments_simulation_ts ON experiments (simulation, timestamp);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_params(row: dict) -> tuple:
+        values = [json.dumps(row.get(f) or []) if f in _JSON_FIELDS else row.get(f) for f in FIELDS]
+        extra = {k: v for k, v in row.items() if k not in FIELDS and k != "id"}
+        return tuple(values) + (json.dumps(extra) if extra else None,)
+
+    @staticmethod
+    def _to_row(r: sqlite3.Row) -> dict:
+        row = {"id": r["id"]}
+        for f in FIELDS:
+            row[f] = json.loads(r[f]) if f in _JSON_FIELDS and r[f] else r[f]
+        if r["extra"]:
+            row.update(json.loads(r["extra"]))
+        return row
+
+    def insert_many(self, rows: list):
+        conn = self._conn()
+        placeholders = ", ".join("?" * (len(FIELDS) + 1))
+        with conn:
+            conn.executemany(
+                f"INSERT INTO experiments ({', '.join(FIELDS)}, extra) VALUES ({placeholders})",
+                [self._to_params(row) for row in rows],
+            )
+
+    def _recent_by(self, column: str, value: str, limit: int) -> list:
+        cur = self._conn().execute(
+            f"SELECT * FROM experiments WHERE {column} = ? ORDER BY timestamp DESC LIMIT ?",
+            (value, limit),
+        )
+        return [self._to_row(r) for r in cur.fetchall()]
+
+    def recent(self, student_id: str, limit: int = 50) -> list:
+        return self._recent_by("student_id", student_id, limit)
+
+    def recent_for_simulation(self, simulation: str, limit: int = 50) -> list:
+        return self._recent_by("simulation", simulation, limit)
+
+    def history(self, student_id: str) -> list:
+        cur = self._conn().execute(
+            "SELECT timestamp, simulation, score, duration FROM experiments WHERE student_id = ?",
+            (student_id,),
+        )
+        return [dict(r) for r in cur.fetchall()]
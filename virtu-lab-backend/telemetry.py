@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import Counter, deque
+from typing import Optional
+from config import TELEMETRY_BUCKET_SECONDS, TELEMETRY_RETENTION_MINUTES
+
+DEFAULT_COHORT = "default"
+
+def failure_names(failures: list) -> set:
+    names = set()
+    for f in failures or []:
+        name = (f.get("name") or f.get("type")) if isinstance(f, dict) else f
+        if name:
+            names.add(str(name).upper())
+    return names
+
+class MisconceptionTelemetry:
+    # Rolling, time-bucketed counters of saved experiments and the failures they
+    # hit, per (cohort, simulation). Queries only touch the buckets inside the
+    # window, so their cost depends on how many distinct failures exist, not on
+    # how many students submitted.
+
+    def __init__(self, bucket_seconds: int = TELEMETRY_BUCKET_SECONDS,
+                 retention_minutes: int = TELEMETRY_RETENTION_MINUTES):
+        self.bucket_seconds = bucket_seconds
+        self.retention_seconds = retention_minutes * 60
+        self._buckets: dict = {}  # bucket start -> (attempts Counter, failures Counter)
+        self._order: deque = deque()
+        self._lock = threading.Lock()
+
+    def _bucket(self, now: float):
+        start = int(now // self.bucket_seconds) * self.bucket_seconds
+        bucket = self._buckets.get(start)
+        if bucket is None:
+            bucket = self._buckets[start] = (Counter(), Counter())
+            self._order.append(start)
+            while self._order and self._order[0] <= start - self.retention_seconds:
+                del self._buckets[self._order.popleft()]
+        return bucket
+
+    def record(self, cohort: Optional[str], simulation: str, failures: list, now: float = None):
+        cohort = cohort or DEFAULT_COHORT
+        with self._lock:
+            attempts, failed = self._bucket(now or time.time())
+            attempts[(cohort, simulation)] += 1
+            # A failure counts once per experiment, however often it recurred.
+            for name in failure_names(failures):
+                failed[(cohort, simulation, name)] += 1
+
+    def top_failures(self, cohort: Optional[str] = None, simulation: Optional[str] = None,
+                     minutes: float = 15, limit: int = 5, now: float = None) -> dict:
+        since = (now or time.time()) - minutes * 60
+        attempts, failed = Counter(), Counter()
+        with self._lock:
+            for start in reversed(self._order):
+                if start + self.bucket_seconds <= since:
+                    break
+                bucket_attempts, bucket_failed = self._buckets[start]
+                for (c, sim), n in bucket_attempts.items():
+                    if (cohort is None or c == cohort) and (simulation is None or sim == simulation):
+                        attempts[sim] += n
+                for (c, sim, name), n in bucket_failed.items():
+                    if (cohort is None or c == cohort) and (simulation is None or sim == simulation):
+                        failed[(sim, name)] += n
+
+        return {
+            "cohort": cohort,
+            "simulation": simulation,
+            "window_minutes": minutes,
+            "experiments": sum(attempts.values()),
+            "top_failures": [
+                {
+                    "simulation": sim,
+                    "failure": name,
+                    "count": n,
+                    "rate": round(n / attempts[sim], 3) if attempts[sim] else 0.0,
+                }
+                for (sim, name), n in failed.most_common(limit)
+            ],
+        }
+
+telemetry = MisconceptionTelemetry()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Backend modules are flat at the package root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
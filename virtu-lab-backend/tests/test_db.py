@@ -0,0 +1,134 @@
+import os
+import time
+
+import pytest
+
+import db
+from storage import SQLiteStorage
+
+# Per-student aggregates and the write-behind journal, against a SQLite store
+# that can be taken down. The queue is flushed by hand; its background thread
+# is parked on a long interval.
+
+class FlakyStorage(SQLiteStorage):
+    def __init__(self, path):
+        super().__init__(path)
+        self.down = False
+        self.history_calls = 0
+        self.insert_calls = 0
+
+    def history(self, student_id):
+        self.history_calls += 1
+        if self.down:
+            raise ConnectionError("store unavailable")
+        return super().history(student_id)
+
+    def recent(self, student_id, limit):
+        if self.down:
+            raise ConnectionError("store unavailable")
+        return super().recent(student_id, limit)
+
+    def insert_many(self, rows):
+        self.insert_calls += 1
+        if self.down:
+            raise ConnectionError("store unavailable")
+        super().insert_many(rows)
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    storage = FlakyStorage(str(tmp_path / "experiments.db"))
+    queue = db._WriteBehindQueue(100, 3600, str(tmp_path / "journal.jsonl"), max_backoff=60)
+    monkeypatch.setattr(db, "_storage", storage)
+    monkeypatch.setattr(db, "_write_queue", queue)
+    monkeypatch.setattr(db, "_stats", db.OrderedDict())
+    yield storage
+    queue._running = False
+    queue._wake.set()
+
+def _record(student_id="s1", simulation="ohm-law", score=80, timestamp=None):
+    row = {"student_id": student_id, "simulation": simulation, "score": score, "duration": 30}
+    if timestamp:
+        row["timestamp"] = timestamp
+    return row
+
+def test_save_does_not_read_history(store):
+    db.save_experiment(_record())
+    assert store.history_calls == 0
+    stats = db.get_student_stats("s1")
+    assert stats["total_experiments"] == 1
+    assert store.history_calls == 1
+
+def test_save_folds_into_cached_aggregate(store):
+    db.save_experiment(_record(score=60))
+    db.flush_experiments()
+    assert db.get_student_stats("s1")["total_experiments"] == 1
+    db.save_experiment(_record(score=100))
+    stats = db.get_student_stats("s1")
+    assert stats["total_experiments"] == 2
+    assert stats["avg_score"] == 80
+    assert store.history_calls == 1
+
+def test_expired_aggregate_is_reloaded_not_folded(store, monkeypatch):
+    db.save_experiment(_record())
+    db.flush_experiments()
+    db.get_student_stats("s1")
+    monkeypatch.setattr(db, "STATS_CACHE_TTL", 0)
+    db.save_experiment(_record(timestamp="2030-01-01T00:00:00+00:00"))
+    assert db.get_student_stats("s1")["total_experiments"] == 2
+
+def test_failed_load_is_not_cached(store):
+    db.save_experiment(_record())
+    db.flush_experiments()
+    store.down = True
+    assert db.get_student_stats("s1")["total_experiments"] == 0
+    assert "s1" not in db._stats
+    store.down = False
+    assert db.get_student_stats("s1")["total_experiments"] == 1
+
+def test_stored_and_in_flight_row_counted_once(store):
+    row = _record(timestamp="2030-01-01T00:00:00+00:00")
+    store.insert_many([row])
+    # Committed, but the flush that wrote it hasn't returned yet.
+    db._write_queue._in_flight = [row]
+    assert db.get_student_stats("s1")["total_experiments"] == 1
+
+def test_journaled_rows_stay_readable(store):
+    store.down = True
+    db.save_experiment(_record(timestamp="2030-01-01T00:00:00+00:00"))
+    db._write_queue.flush()
+    assert os.path.exists(db._write_queue.journal_path)
+    assert len(db.get_student_experiments("s1")) == 1
+    assert db.get_student_stats("s1")["total_experiments"] == 1
+
+def test_journal_replays_once_store_recovers(store):
+    store.down = True
+    db.save_experiment(_record(timestamp="2030-01-01T00:00:00+00:00"))
+    db._write_queue.flush()
+    store.down = False
+    db._write_queue.flush()
+    assert not os.path.exists(db._write_queue.journal_path)
+    assert not os.path.exists(db._write_queue.journal_path + ".replay")
+    assert db._write_queue.pending_for("s1") == []
+    assert len(store.history("s1")) == 1
+    assert db.get_student_stats("s1")["total_experiments"] == 1
+
+def test_failed_replay_backs_off(store):
+    queue = db._write_queue
+    queue.flush_interval = 5
+    store.down = True
+    db.save_experiment(_record(timestamp="2030-01-01T00:00:00+00:00"))
+    queue.flush()
+    queue.flush()  # replay fails and is re-journaled
+    assert queue._replay_delay == 5
+    assert queue._next_replay > time.monotonic()
+    calls = store.insert_calls
+    queue.flush()
+    assert store.insert_calls == calls
+    assert len(queue.pending_for("s1")) == 1
+
+def test_journal_survives_restart(store, tmp_path):
+    store.down = True
+    db.save_experiment(_record(timestamp="2030-01-01T00:00:00+00:00"))
+    db._write_queue.flush()
+    restarted = db._WriteBehindQueue(100, 3600, db._write_queue.journal_path)
+    assert len(restarted.pending_for("s1")) == 1
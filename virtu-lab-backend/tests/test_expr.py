@@ -0,0 +1,113 @@
+import math
+import time
+
+import numpy as np
+import pytest
+
+from expr import ExpressionError, compile_expression
+from physics import check_challenge
+
+# Run from virtu-lab-backend with `python -m pytest tests` (needs pytest on top
+# of requirements.txt).
+
+@pytest.mark.parametrize("source", [
+    "__import__('os')",
+    "inputs.__class__",
+    "(lambda: 1)()",
+    "inputs.voltage if 1 else 2",
+    "[1, 2][0]",
+    "'a' * 3",
+    "True + 1",
+    "inputs.voltage < 3",
+    "sin",
+    "open('x')",
+    "sin(x=inputs.voltage)",
+    "max(*[1, 2])",
+])
+def test_rejects_non_arithmetic(source):
+    with pytest.raises(ExpressionError):
+        compile_expression(source)
+
+@pytest.mark.parametrize("source", [
+    "max()",
+    "sin(inputs.voltage, 2)",
+    "round(inputs.voltage, 2)",
+    "sqrt()",
+    "pow(inputs.voltage)",
+    "atan2(inputs.voltage, 1, 2)",
+    "max(inputs.voltage, 1, 2, 3, 4, 5, 6, 7, 8)",
+])
+def test_rejects_wrong_arity(source):
+    with pytest.raises(ExpressionError):
+        compile_expression(source)
+
+def test_ufunc_third_argument_cannot_write_into_inputs():
+    # Bare np.maximum would take its third positional argument as `out=`.
+    voltage = np.array([1.0, 5.0])
+    resistance = np.array([0.0, 0.0])
+    value = compile_expression("max(inputs.voltage, 2, inputs.resistance)").evaluate(
+        {"voltage": voltage, "resistance": resistance})
+    np.testing.assert_array_equal(value, [2.0, 5.0])
+    np.testing.assert_array_equal(resistance, [0.0, 0.0])
+
+def test_variadic_min_max():
+    expr = compile_expression("max(inputs.voltage, 3, 7) + min(inputs.voltage, 2, 9)")
+    assert expr.evaluate({"voltage": 5}) == 9.0
+
+@pytest.mark.parametrize("source", ["9**9**9", "10 ** 400", "(2 ** 64) ** 64 ** 64", "pow(9, 9 ** 9)"])
+def test_huge_powers_are_bounded(source):
+    started = time.perf_counter()
+    value = compile_expression(source).evaluate({})
+    assert math.isinf(value)
+    assert time.perf_counter() - started < 1
+
+def test_division_by_zero_is_not_an_exception():
+    expr = compile_expression("1 / inputs.voltage + 5 % inputs.voltage")
+    assert math.isnan(expr.evaluate({"voltage": 0}))
+    assert math.isinf(compile_expression("1 / 0").evaluate({}))
+
+def test_overflowing_input_is_not_an_exception():
+    assert math.isinf(compile_expression("inputs.voltage ** inputs.resistance").evaluate({"voltage": 10, "resistance": 400}))
+
+def test_arrays_broadcast_and_are_not_mutated():
+    voltage = np.array([1.0, 2.0, 3.0])
+    value = compile_expression("max(inputs.voltage, 2) / inputs.resistance").evaluate(
+        {"voltage": voltage, "resistance": 2})
+    np.testing.assert_allclose(value, [1.0, 1.0, 1.5])
+    np.testing.assert_array_equal(voltage, [1.0, 2.0, 3.0])
+
+def test_js_dialect_and_defaults():
+    expr = compile_expression("Math.sqrt(inputs.velocity ?? 4) * Math.PI + inputs.voltage")
+    assert expr.evaluate({}) == pytest.approx(2 * math.pi + 5)
+
+def test_check_challenge_survives_a_failing_compute():
+    challenge = {"target_key": "current", "target_value": 30, "target_unit": "mA", "tolerance": 5,
+                 "fixed_params": {"voltage": 6}}
+
+    def broken(inputs):
+        raise TypeError("bad compute")
+
+    def overflowing(inputs):
+        raise OverflowError("too big")
+
+    for compute in (broken, overflowing):
+        # Falls back to the physics engine rather than raising.
+        assert check_challenge("ohm-law", challenge, compute)["solvable"]
+
+@pytest.mark.parametrize("inputs", [
+    {"voltage": 10 ** 400},
+    {"voltage": [1, 10 ** 400]},
+    {"voltage": "abc"},
+    {"voltage": [[1, 2], [3]]},
+    {"voltage": [1, 2, 3], "current": [1, 2]},
+])
+def test_bad_inputs_raise_expression_error(inputs):
+    compiled = compile_expression("inputs.voltage * inputs.current")
+    with pytest.raises(ExpressionError):
+        compiled.evaluate(inputs)
+
+def test_max_points_caps_broadcast_size():
+    compiled = compile_expression("inputs.voltage * inputs.current")
+    assert compiled.evaluate({"voltage": [1.0] * 10, "current": 2}, max_points=10).shape == (10,)
+    with pytest.raises(ExpressionError):
+        compiled.evaluate({"voltage": [[1.0]] * 10, "current": [1.0] * 10}, max_points=50)
@@ -0,0 +1,20 @@
+import json
+
+from observations import compact, expand
+from physics import check_observations
+
+def test_compact_handles_out_of_range_numbers():
+    rows = [
+        {"voltage": 10 ** 400, "current": 1.0},
+        {"voltage": float("inf"), "current": 2},
+        {"voltage": 3, "current": float("nan")},
+    ]
+    stored = compact(rows)
+    # Must survive a strict JSON round trip, as the stores do.
+    assert json.loads(json.dumps(stored, allow_nan=False)) == stored
+    assert stored["columns"] == {"voltage": [None, None, 3.0], "current": [1.0, 2.0, None]}
+    assert expand(stored)[2] == {"voltage": 3.0, "row": 2}
+
+def test_observation_check_ignores_out_of_range_numbers():
+    result = check_observations("ohm-law", [{"voltage": float("inf"), "current": 10 ** 400, "resistance": 2}])
+    json.dumps(result, allow_nan=False)
@@ -0,0 +1,214 @@
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Packs an animation's frames into a few texture atlases plus a JSON index, so
+# the page makes a handful of requests instead of one per frame.
+#
+#   1. hash    every frame gets a difference hash (dHash) of its composited
+#              luminance and the bounding box of its opaque pixels;
+#   2. dedup   a frame within --threshold bits of an already kept sprite, and
+#              whose thumbnail differs from it by at most --max-diff grey
+#              levels anywhere, reuses it; consecutive repeats just lengthen
+#              the previous frame. The hash alone is too coarse to tell a
+#              blink from a still frame, the thumbnail check is what catches it;
+#   3. pack    kept sprites, trimmed to their bounding box, are shelf-packed
+#              into --max-size square atlases;
+#   4. write   atlases and index.json.
+#
+# index.json is deliberately terse (arrays, not objects):
+#   sprites: [atlas, x, y, w, h, offset_x, offset_y]  (offset into the full frame)
+#   frames:  [sprite, duration_ms]                    (playback order)
+
+STAGES = ("hash", "dedup", "pack", "write")
+
+
+def dhash(gray, size):
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+THUMB_SIZE = (160, 90)
+
+
+def inspect_frame(path, hash_size, alpha_min):
+    img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        return path, None, None, None, None
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGRA)
+    elif img.shape[2] == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+    alpha = img[..., 3].astype(np.float32) / 255
+    # Composite over mid grey so transparent pixels hash the same whatever
+    # colour the exporter left under them.
+    gray = cv2.cvtColor(img[..., :3], cv2.COLOR_BGR2GRAY).astype(np.float32)
+    gray = (gray * alpha + 128 * (1 - alpha)).astype(np.uint8)
+    ys, xs = np.nonzero(img[..., 3] >= alpha_min)
+    if len(xs):
+        bbox = (int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+    else:
+        bbox = (0, 0, 1, 1)
+    thumb = cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+    return path, dhash(gray, hash_size), bbox, img.shape[1::-1], thumb
+
+
+def dedup(inspected, threshold, max_diff, frame_ms):
+    # Returns the kept sprites (path, bbox) and the frame list as
+    # [sprite index, duration]. Comparing against every kept sprite, not just
+    # the previous one, also catches loops that come back to an earlier pose.
+    sprites, kept, frames = [], [], []
+    for path, h, bbox, _, thumb in inspected:
+        thumb = thumb.astype(np.int16)
+        match = next((i for i, (kh, kt) in enumerate(kept)
+                      if hamming(h, kh) <= threshold and np.abs(thumb - kt).max() <= max_diff), None)
+        if match is None:
+            match = len(sprites)
+            sprites.append((path, bbox))
+            kept.append((h, thumb))
+        if frames and frames[-1][0] == match:
+            frames[-1][1] += frame_ms
+        else:
+            frames.append([match, frame_ms])
+    return sprites, frames
+
+
+def shelf_pack(sizes, max_size, padding):
+    # Tallest first; each shelf is as tall as its first sprite. Returns
+    # (atlas, x, y) per input plus each atlas's used (width, height).
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    placements = [None] * len(sizes)
+    atlases = []
+    x = y = shelf_h = 0
+    for i in order:
+        w, h = sizes[i][0] + padding, sizes[i][1] + padding
+        if w > max_size or h > max_size:
+            raise SystemExit(f"sprite {w}x{h} does not fit in a {max_size}px atlas; raise --max-size or use --scale")
+        if not atlases:
+            atlases.append([0, 0])
+        if x + w > max_size:
+            x, y, shelf_h = 0, y + shelf_h, 0
+        if y + h > max_size:
+            atlases.append([0, 0])
+            x = y = shelf_h = 0
+        placements[i] = (len(atlases) - 1, x, y)
+        used = atlases[-1]
+        used[0], used[1] = max(used[0], x + w), max(used[1], y + h)
+        x += w
+        shelf_h = max(shelf_h, h)
+    return placements, atlases
+
+
+def build_parser(**defaults):
+    parser = argparse.ArgumentParser(description="Deduplicate animation frames and pack them into sprite atlases.")
+    parser.add_argument("input", nargs="?", default=defaults.get("input"), help="directory of transparent frames")
+    parser.add_argument("-o", "--output", default=defaults.get("output"), help="directory for atlases and index.json")
+    parser.add_argument("-p", "--pattern", default="*.png", help="glob for frames, sorted by name = playback order")
+    parser.add_argument("--fps", type=float, default=25, help="playback rate of the source frames")
+    parser.add_argument("--hash-size", type=int, default=16, help="dHash grid size (bits = size squared)")
+    parser.add_argument("--threshold", type=int, default=8, help="max differing hash bits for a duplicate candidate")
+    parser.add_argument("--max-diff", type=int, default=24,
+                        help="max per-pixel grey-level difference between duplicate thumbnails")
+    parser.add_argument("--alpha-min", type=int, default=8, help="alpha below this counts as empty when trimming")
+    parser.add_argument("--scale", type=float, default=1.0, help="resize sprites, e.g. 0.5 for a mobile set")
+    parser.add_argument("--max-size", type=int, default=4096, help="atlas width/height limit in pixels")
+    parser.add_argument("--padding", type=int, default=2, help="transparent gap between sprites")
+    parser.add_argument("--format", choices=("webp", "png"), default="webp", help="atlas image format")
+    parser.add_argument("--quality", type=int, default=90, help="WebP quality (101 = lossless)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="worker processes for hashing")
+    return parser
+
+
+def run(args):
+    if not args.input or not args.output:
+        raise SystemExit("input and --output directories are required")
+    paths = sorted(glob.glob(os.path.join(args.input, args.pattern)))
+    if not paths:
+        raise SystemExit(f"no frames matching {args.pattern} in {args.input}")
+    timings = {}
+    frame_ms = round(1000 / args.fps)
+
+    t = time.perf_counter()
+    workers = max(1, min(args.workers, len(paths)))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        inspected = list(pool.map(inspect_frame, paths, [args.hash_size] * len(paths),
+                                  [args.alpha_min] * len(paths), chunksize=max(1, len(paths) // (workers * 4))))
+    unreadable = [p for p, h, *_ in inspected if h is None]
+    inspected = [entry for entry in inspected if entry[1] is not None]
+    if not inspected:
+        raise SystemExit("no readable frames")
+    canvas = inspected[0][3]
+    timings["hash"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    sprites, frames = dedup(inspected, args.threshold, args.max_diff, frame_ms)
+    timings["dedup"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    s = args.scale
+    sizes = [(max(1, round((x1 - x0) * s)), max(1, round((y1 - y0) * s))) for _, (x0, y0, x1, y1) in sprites]
+    placements, used = shelf_pack(sizes, args.max_size, args.padding)
+    sheets = [np.zeros((h, w, 4), np.uint8) for w, h in used]
+    for (path, (x0, y0, x1, y1)), (w, h), (atlas, x, y) in zip(sprites, sizes, placements):
+        crop = cv2.imread(path, cv2.IMREAD_UNCHANGED)[y0:y1, x0:x1]
+        if crop.shape[2] == 3:
+            crop = cv2.cvtColor(crop, cv2.COLOR_BGR2BGRA)
+        if (w, h) != (x1 - x0, y1 - y0):
+            crop = cv2.resize(crop, (w, h), interpolation=cv2.INTER_AREA)
+        sheets[atlas][y:y + h, x:x + w] = crop
+    timings["pack"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    os.makedirs(args.output, exist_ok=True)
+    params = [cv2.IMWRITE_WEBP_QUALITY, args.quality] if args.format == "webp" else [cv2.IMWRITE_PNG_COMPRESSION, 9]
+    names = []
+    for i, sheet in enumerate(sheets):
+        name = f"atlas-{i}.{args.format}"
+        if not cv2.imwrite(os.path.join(args.output, name), sheet, params):
+            raise SystemExit(f"could not write {name}")
+        names.append(name)
+    index = {
+        "version": 1,
+        "width": round(canvas[0] * s),
+        "height": round(canvas[1] * s),
+        "atlases": names,
+        "sprites": [[atlas, x, y, w, h, round(x0 * s), round(y0 * s)]
+                    for (_, (x0, y0, _, _)), (w, h), (atlas, x, y) in zip(sprites, sizes, placements)],
+        "frames": frames,
+    }
+    with open(os.path.join(args.output, "index.json"), "w") as f:
+        json.dump(index, f, separators=(",", ":"))
+    timings["write"] = time.perf_counter() - t
+
+    source_bytes = sum(os.path.getsize(p) for p, *_ in inspected)
+    output_bytes = sum(os.path.getsize(os.path.join(args.output, n)) for n in names + ["index.json"])
+    print(f"{len(inspected)} frames -> {len(sprites)} unique sprites in {len(names)} atlas(es), "
+          f"{len(frames)} index entries")
+    print(f"requests {len(inspected)} -> {len(names) + 1}, bytes {source_bytes / 1e6:.1f} MB -> {output_bytes / 1e6:.1f} MB")
+    for stage in STAGES:
+        print(f"  {stage:<6} {timings[stage]:7.2f}s")
+    for path in unreadable:
+        print(f"  unreadable: {path}")
+    return 0
+
+
+def main(argv=None, **defaults):
+    return run(build_parser(**defaults).parse_args(argv))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(
+        input=os.path.join(os.path.dirname(os.path.abspath(__file__)), "public", "baba-transparent-clean"),
+        output=os.path.join(os.path.dirname(os.path.abspath(__file__)), "public", "baba-atlas"),
+    ))
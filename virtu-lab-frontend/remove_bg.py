@@ -1,45 +1,164 @@
-import cv2
-import numpy as np
+import argparse
+import concurrent.futures
 import glob
 import os
-import concurrent.futures
+import time
+from functools import partial
+
+import cv2
+import numpy as np
+
+# Removes the light checkerboard background baked into exported sprite frames.
+# The checkerboard is two near-white, unsaturated tones, so a plain colour
+# flood fill stops at the first tile edge. Instead every pixel that is bright
+# and unsaturated is a background *candidate*, and only the candidate regions
+# connected to the image corners are cleared. Baba's white beard passes the
+# colour test too, but it is enclosed by skin and robe, so it stays opaque.
+
+STAGES = ("read", "mask", "fill", "alpha", "write")
 
-os.makedirs('public/baba-transparent-clean', exist_ok=True)
-
-def process_file(f):
-    img = cv2.imread(f)
-    if img is None: return
-    
-    # Create an alpha channel
-    bg_removed = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
-    
-    # Define thresholds for white and light grey
-    # The checkerboard has #ffffff (255,255,255) and #e6e6e6 (230,230,230)
-    # We can mask out any pixel that is very bright and very unsaturated
-    
+
+def background_mask(img, sat_max, val_min):
     hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-    h, s, v = cv2.split(hsv)
-    
-    # The checkerboard is grayscale and very bright
-    # Saturation is almost 0, Value is high (e.g. > 220)
-    # We also don't want to remove his white beard or clothes. Right now he is mostly orange/skin tone/white beard.
-    # His beard is white, but usually not EXACTLY the checkerboard color or we can use a contour matching technique.
-    # A safer approach for this specific checkerboard: Flood fill from the corners!
-    
-    # Create mask for floodfill
-    h, w = img.shape[:2]
-    mask = np.zeros((h+2, w+2), np.uint8)
-    
-    # Flood fill from the 4 corners, assuming they are background
-    cv2.floodFill(bg_removed, mask, (0,0), (255,255,255,0), (10,10,10,10), (10,10,10,10), cv2.FLOODFILL_FIXED_RANGE)
-    cv2.floodFill(bg_removed, mask, (w-1,0), (255,255,255,0), (10,10,10,10), (10,10,10,10), cv2.FLOODFILL_FIXED_RANGE)
-    cv2.floodFill(bg_removed, mask, (0,h-1), (255,255,255,0), (10,10,10,10), (10,10,10,10), cv2.FLOODFILL_FIXED_RANGE)
-    cv2.floodFill(bg_removed, mask, (w-1,h-1), (255,255,255,0), (10,10,10,10), (10,10,10,10), cv2.FLOODFILL_FIXED_RANGE)
-    
-    # The checkerboard might not flood fill nicely. Let's try thresholding instead but isolated to the border/background
-    
-    # Better yet, since we have the original `baba.png` which had a transparent background, did we? No, it was white.
-    # Let's use `rembg` which uses AI to perfectly cut out the background.
-    print(f"skipping opencv, will use rembg instead for {f}")
-
-# process_file('public/baba-frames-new/ezgif-frame-001.jpg')
+    candidate = ((hsv[..., 1] <= sat_max) & (hsv[..., 2] >= val_min)).astype(np.uint8)
+    # JPEG ringing leaves single-pixel gaps between tiles; close them first.
+    candidate = cv2.morphologyEx(candidate, cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8))
+    return candidate
+
+
+def fill_from_edges(candidate, seeds="corners"):
+    # Flood fill over the candidate mask: label its 4-connected regions and
+    # keep the ones a seed pixel falls in.
+    _, labels = cv2.connectedComponents(candidate, connectivity=4)
+    h, w = labels.shape
+    if seeds == "border":
+        edge = np.concatenate([labels[0], labels[-1], labels[:, 0], labels[:, -1]])
+    else:
+        edge = np.array([labels[0, 0], labels[0, w - 1], labels[h - 1, 0], labels[h - 1, w - 1]])
+    keep = np.unique(edge[edge > 0])
+    return np.isin(labels, keep)
+
+
+def to_rgba(img, background, shrink, feather):
+    bg = background.astype(np.uint8)
+    if shrink:
+        # Eat the light fringe the checkerboard leaves around the outline.
+        bg = cv2.dilate(bg, np.ones((2 * shrink + 1, 2 * shrink + 1), np.uint8))
+    alpha = np.where(bg > 0, 0, 255).astype(np.uint8)
+    if feather:
+        alpha = cv2.GaussianBlur(alpha, (2 * feather + 1, 2 * feather + 1), 0)
+    rgba = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+    rgba[..., 3] = alpha
+    return rgba
+
+
+def _init_worker():
+    # Parallelism comes from the pool; OpenCV's own threads would only fight it.
+    cv2.setNumThreads(1)
+
+
+def process_frame(job, sat_max, val_min, seeds, shrink, feather):
+    src, dst = job
+    timings = dict.fromkeys(STAGES, 0.0)
+
+    t = time.perf_counter()
+    img = cv2.imread(src, cv2.IMREAD_COLOR)
+    timings["read"] = time.perf_counter() - t
+    if img is None:
+        return src, False, timings
+
+    t = time.perf_counter()
+    candidate = background_mask(img, sat_max, val_min)
+    timings["mask"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    background = fill_from_edges(candidate, seeds)
+    timings["fill"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    rgba = to_rgba(img, background, shrink, feather)
+    timings["alpha"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    # Write then rename so an interrupted run never leaves a truncated PNG
+    # that looks up to date next time.
+    tmp = dst + ".tmp.png"
+    ok = cv2.imwrite(tmp, rgba)
+    if ok:
+        os.replace(tmp, dst)
+    timings["write"] = time.perf_counter() - t
+    return src, ok, timings
+
+
+def find_jobs(input_dir, output_dir, patterns, force):
+    sources = sorted({f for p in patterns for f in glob.glob(os.path.join(input_dir, p))})
+    jobs, skipped = [], 0
+    for src in sources:
+        dst = os.path.join(output_dir, os.path.splitext(os.path.basename(src))[0] + ".png")
+        if not force and os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src):
+            skipped += 1
+            continue
+        jobs.append((src, dst))
+    return jobs, skipped
+
+
+def build_parser(**defaults):
+    parser = argparse.ArgumentParser(description="Strip the checkerboard background from sprite frames.")
+    parser.add_argument("input", nargs="?", default=defaults.get("input"), help="directory of source frames")
+    parser.add_argument("-o", "--output", default=defaults.get("output"), help="directory for transparent PNGs")
+    parser.add_argument("-p", "--pattern", action="append", help="glob(s) for source frames (default *.jpg, *.png)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--chunksize", type=int, default=0, help="frames per task sent to a worker (0 = auto)")
+    parser.add_argument("--sat-max", type=int, default=25, help="max HSV saturation of background pixels")
+    parser.add_argument("--val-min", type=int, default=200, help="min HSV value of background pixels")
+    parser.add_argument("--seeds", choices=("corners", "border"), default="corners",
+                        help="flood from the four corners or from every border pixel")
+    parser.add_argument("--shrink", type=int, default=1, help="pixels of fringe to cut around the sprite")
+    parser.add_argument("--feather", type=int, default=1, help="alpha blur radius in pixels")
+    parser.add_argument("-f", "--force", action="store_true", help="reprocess frames that are up to date")
+    return parser
+
+
+def run(args):
+    if not args.input or not args.output:
+        raise SystemExit("input and --output directories are required")
+    started = time.perf_counter()
+    os.makedirs(args.output, exist_ok=True)
+    jobs, skipped = find_jobs(args.input, args.output, args.pattern or ["*.jpg", "*.png"], args.force)
+    discovered = time.perf_counter() - started
+    print(f"{len(jobs)} frame(s) to process, {skipped} up to date ({discovered:.2f}s scanning)")
+    if not jobs:
+        return 0
+
+    work = partial(process_frame, sat_max=args.sat_max, val_min=args.val_min,
+                   seeds=args.seeds, shrink=args.shrink, feather=args.feather)
+    workers = max(1, min(args.workers, len(jobs)))
+    # A few chunks per worker keeps IPC overhead low without leaving one
+    # worker holding the tail of the batch.
+    chunksize = args.chunksize or max(1, len(jobs) // (workers * 4))
+    totals = dict.fromkeys(STAGES, 0.0)
+    failed = []
+    t = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for src, ok, timings in pool.map(work, jobs, chunksize=chunksize):
+            if not ok:
+                failed.append(src)
+            for stage, seconds in timings.items():
+                totals[stage] += seconds
+    wall = time.perf_counter() - t
+
+    print(f"processed {len(jobs) - len(failed)} frame(s) in {wall:.2f}s "
+          f"with {workers} worker(s), chunksize {chunksize}")
+    for stage in STAGES:
+        print(f"  {stage:<6} {totals[stage]:7.2f}s total  ({totals[stage] / len(jobs) * 1000:6.1f} ms/frame)")
+    for src in failed:
+        print(f"  failed: {src}")
+    return 1 if failed else 0
+
+
+def main(argv=None, **defaults):
+    return run(build_parser(**defaults).parse_args(argv))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())